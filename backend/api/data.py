@@ -1,9 +1,13 @@
 from fastapi import APIRouter, HTTPException, status, Body
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import StreamingResponse
-from typing import List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional
 from datetime import datetime, timedelta
-import pandas as pd
+import csv
 import io
+import itertools
+import json
+import math
 from services.tdengine_service import tdengine_service
 from services.data_writer import data_writer
 from services.device_service import device_service
@@ -13,6 +17,57 @@ from config.config import settings
 
 router = APIRouter()
 
+def _json_row(row: Dict[str, Any]) -> str:
+    """单行 -> JSON；NaN / Infinity 不是合法 JSON，输出为 null"""
+    row = jsonable_encoder(row)
+    try:
+        return json.dumps(row, ensure_ascii=False, allow_nan=False)
+    except ValueError:
+        return json.dumps({k: None if isinstance(v, float) and not math.isfinite(v) else v for k, v in row.items()},
+                          ensure_ascii=False, allow_nan=False)
+
+def _json_array_stream(rows: Iterator[Dict[str, Any]], chunk_rows: int = 200) -> Iterator[str]:
+    """将行迭代器编码为 JSON 数组，分块输出（不整体驻留内存）"""
+    yield "["
+    separator, chunk = "", []
+    try:
+        for row in rows:
+            chunk.append(_json_row(row))
+            if len(chunk) >= chunk_rows:
+                yield separator + ",".join(chunk)
+                separator, chunk = ",", []
+    except Exception as e:
+        # Headers are already sent: abort the transfer rather than close the array on a truncated result
+        print(f"获取设备数据中断: {e}")
+        raise
+    if chunk:
+        yield separator + ",".join(chunk)
+    yield "]"
+
+def _csv_stream(rows: Iterator[Dict[str, Any]], chunk_rows: int = 500) -> Iterator[str]:
+    """将行迭代器编码为 CSV（表头取自首行），分块输出（不整体驻留内存）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    header_written, count = False, 0
+    try:
+        for row in rows:
+            if not header_written:
+                writer.writerow(row.keys())
+                header_written = True
+            writer.writerow(row.values())
+            count += 1
+            if count >= chunk_rows:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                count = 0
+    except Exception as e:
+        # Headers are already sent: abort the download rather than end a partial file as if complete
+        print(f"导出数据中断: {e}")
+        raise
+    if buffer.tell():
+        yield buffer.getvalue()
+
 @router.get("/devices/{device_id}/export")
 def export_device_data(
     device_id: str, 
@@ -30,24 +85,23 @@ def export_device_data(
         # 1. Fetch data (limit to reasonable amount, e.g. 10000 or paginate)
         # Here we fetch all within range, be careful with large ranges
         limit = 10000 
-        data = tdengine_service.get_device_data(device_id, limit, start_time, end_time)
         
-        if not data:
-            raise HTTPException(status_code=404, detail="No data found for this range")
-            
-        # 2. Convert to DataFrame
-        df = pd.DataFrame(data)
-        
-        # 3. Export
+        # 2. Export
         if format.lower() == "csv":
-            stream = io.StringIO()
-            df.to_csv(stream, index=False)
-            response = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
+            # Rows stream from the query straight into CSV chunks: the result set is never held in memory
+            rows = tdengine_service.iter_device_data(device_id, limit, start_time, end_time)
+            first = next(rows, None)
+            if first is None:
+                raise HTTPException(status_code=404, detail="No data found for this range")
+            response = StreamingResponse(_csv_stream(itertools.chain([first], rows)), media_type="text/csv")
             response.headers["Content-Disposition"] = f"attachment; filename=device_{device_id}_data.csv"
             return response
         elif format.lower() == "json":
-            # Just return JSON response directly
-            return data
+            # Columnar result: no per-row dicts until the response rows (as before)
+            data = tdengine_service.get_device_data_columnar(device_id, limit, start_time, end_time)
+            if not data or not any(data.values()):
+                raise HTTPException(status_code=404, detail="No data found for this range")
+            return [dict(zip(data, row)) for row in zip(*data.values())]
         else:
             raise HTTPException(status_code=400, detail="Unsupported format")
             
@@ -131,39 +185,26 @@ def generate_history_data(
             # { "timestamp": "...", "data": { param: val ... } }
             # DataGenerator returns exactly this structure.
             
-            # However, insert_data writes one by one.
-            # Ideally we need batch insert for performance.
-            # But let's reuse insert_data for simplicity first, or check if we can optimize.
-            # tdengine_service doesn't have batch insert yet.
-            
-            # Optimization: Just call insert_data for now.
+            # insert_data only enqueues; the service coalesces rows into multi-VALUES INSERTs
+            # and flush() below waits for them.
             # Filter tags here? tdengine_service.insert_data takes "data" dict.
             # We should filter tags out from data["data"] if they are tags.
             
-            # Filter tags
-            insert_payload = data.copy()
-            filtered_data = {}
-            
-            # Identify tag IDs
-            tag_ids = set()
-            for p in device.parameters:
-                is_tag = False
-                if isinstance(p, dict): is_tag = p.get('is_tag', False)
-                elif hasattr(p, 'is_tag'): is_tag = p.is_tag
-                if is_tag: 
-                    p_id = p.get('id') if isinstance(p, dict) else p.id
-                    tag_ids.add(p_id)
-            
-            for k, v in data["data"].items():
-                if k not in tag_ids:
-                    filtered_data[k] = v
-            
-            insert_payload["data"] = filtered_data
+            # Filter tags (tag / metric ids are cached on the device), sharing the envelope fields
+            values = data["data"]
+            insert_payload = {
+                "device_id": data["device_id"],
+                "timestamp": data["timestamp"],
+                "data": {k: values[k] for k in device.metric_ids if k in values}
+            }
             
             tdengine_service.insert_data(device_id, insert_payload)
             
             count += 1
             current_dt += timedelta(milliseconds=interval_ms)
+        
+        # Rows are written by the time the response says so
+        tdengine_service.flush()
             
         return {"message": f"Successfully generated {count} data points", "count": count}
         
@@ -183,9 +224,13 @@ def get_device_data(device_id: str, limit: int = 100, start_time: str = None, en
         if not ConfigService.is_tdengine_enabled():
             return []
         
-        # 获取设备数据
-        data = tdengine_service.get_device_data(device_id, limit, start_time, end_time)
-        return data
+        # 获取设备数据：逐行读取并流式编码，large limits do not materialize the whole result
+        rows = tdengine_service.iter_device_data(device_id, limit, start_time, end_time)
+        # Pull the first row here, so connection / query errors still answer []
+        first = next(rows, None)
+        if first is None:
+            return []
+        return StreamingResponse(_json_array_stream(itertools.chain([first], rows)), media_type="application/json")
     except Exception as e:
         print(f"获取设备数据失败: {e}")
         return []
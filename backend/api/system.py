@@ -56,13 +56,11 @@ def get_system_status():
     # 从数据库获取TDengine配置
     tdengine_config = ConfigService.get_tdengine_config()
     
-    # 检查TDengine连接状态
+    # 检查TDengine连接状态（不断开共享连接：DataWriter 等正在使用同一连接池）
     tdengine_connected = False
     if tdengine_config.get("enabled", False):
         try:
-            tdengine_connected = tdengine_service.connect()
-            if tdengine_connected:
-                tdengine_service.disconnect()
+            tdengine_connected = tdengine_service.check_connection()
         except Exception as e:
             print(f"TDengine连接检查失败: {e}")
             tdengine_connected = False
@@ -71,6 +69,7 @@ def get_system_status():
         "status": "running",
         "tdengine_connected": tdengine_connected,
         "tdengine_enabled": tdengine_config.get("enabled", False),
+        "tdengine_pool": tdengine_service.pool_stats(),
         "app_host": settings.app_host,
         "app_port": settings.app_port,
         "debug": settings.debug
@@ -129,15 +128,19 @@ def update_tdengine_config(config: dict):
         
         if not success:
             return {"success": False, "message": "数据库配置更新失败"}
+        tdengine_service.invalidate_config()
         
-        # 如果启用了TDengine，重新连接
+        # 如果启用了TDengine，重新连接（即连接测试：tested/latency_ms 告知客户端无需再调用 test-connection）
         if config.get("enabled", False):
             tdengine_service.disconnect()
+            started = time.perf_counter()
             success = tdengine_service.connect()
             if not success:
-                return {"success": False, "message": "配置更新成功，但TDengine连接失败"}
+                return {"success": False, "tested": True, "message": "配置更新成功，但TDengine连接失败"}
+            return {"success": True, "tested": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "message": "配置更新成功"}
         
-        return {"success": True, "message": "配置更新成功"}
+        return {"success": True, "tested": False, "message": "配置更新成功"}
         
     except Exception as e:
         return {"success": False, "message": f"配置更新失败: {str(e)}"}
@@ -18,6 +18,10 @@ a = Analysis(
         'uvicorn.protocols',
         'uvicorn.protocols.http',
         'uvicorn.protocols.http.auto',
+        'uvicorn.protocols.http.httptools_impl',
+        'uvicorn.loops.uvloop',
+        'httptools',
+        'uvloop',
         'uvicorn.lifespan',
         'uvicorn.lifespan.on',
         'sqlalchemy.sql.default_comparator',
@@ -26,7 +30,6 @@ a = Analysis(
         'fastapi',
         'starlette',
         'taospy',
-        'pandas',
         'numpy',
         'paho.mqtt',
         'pymodbus',
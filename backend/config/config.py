@@ -23,18 +23,26 @@ class Settings(BaseSettings):
     tdengine_password: str = "taosdata"
     tdengine_database: str = "device_simulator"
     tdengine_enabled: bool = False  # TDengine开关，默认关闭
+    tdengine_pool_size: int = 8  # Native模式连接池大小
+    tdengine_schemaless: bool = False  # Native模式下仿真数据以行协议（schemaless）写入；需客户端 taos.cfg 配置 smlChildTableName tname
     
     # 数据库配置
     database_url: str = f"sqlite:///{DB_PATH}"  # 使用绝对路径，确保数据库文件位置固定
+    db_pool_size: int = 20  # 连接池常驻连接数
+    db_max_overflow: int = 30  # 超出 pool_size 的临时连接数（LIFO 复用，空闲后自然回收）
+    db_pool_timeout: int = 30  # 获取连接超时（秒）
+    db_pool_recycle: int = 1800  # 连接最长复用时间（秒）
     
     # 系统配置
     app_host: str = "0.0.0.0"
     app_port: int = 8000
     debug: bool = True
+    max_gzip_request_size: int = 50 * 1024 * 1024  # gzip 请求体解压后的最大字节数，超出返回 413
     
     # 数据生成配置
     default_sampling_rate: int = 1000  # 默认采样频率，单位：毫秒
     max_batch_size: int = 1000  # 批量写入最大条数
+    simulation_processes: int = 0  # 数据生成进程数：0 为进程内线程池；>0 时设备按ID哈希分片到多个进程（大规模CPU密集仿真）
     
     class Config:
         env_file = ".env"
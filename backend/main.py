@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 print("Importing CORS...", flush=True)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 print("Importing settings...", flush=True)
 from config.config import settings
 print("Importing api routers...", flush=True)
@@ -20,9 +21,11 @@ from api import ai
 print("Importing api.prompt...", flush=True)
 from api import prompt
 print("Importing database...", flush=True)
-from services.database_service import Base, engine
+from services.database_service import init_schema, request_session_scope
+from utils.gzip_request import GZipRequestMiddleware
 print("Importing data_writer...", flush=True)
 from services.data_writer import data_writer
+from services.tdengine_service import tdengine_service
 print("Importing mqtt_service...", flush=True)
 from services.protocols.mqtt_service import mqtt_service
 print("Importing modbus_service...", flush=True)
@@ -32,9 +35,6 @@ from services.protocols.opcua_service import opcua_service
 print("Importing models...", flush=True)
 from models import config, category as category_model, prompt as prompt_model
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Device Simulator API",
     description="设备运行模拟器API服务",
@@ -50,6 +50,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 压缩：响应体（查询/导出的大 JSON、CSV）按 Accept-Encoding 压缩；gzip 压缩上传的请求体先解压
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+app.add_middleware(GZipRequestMiddleware, max_size=settings.max_gzip_request_size)
+
+# 请求级数据库会话：同一请求内的服务调用共享一个连接
+@app.middleware("http")
+async def db_session_middleware(request, call_next):
+    with request_session_scope():
+        return await call_next(request)
+
 # 注册路由
 app.include_router(device.router, prefix="/api/device", tags=["device"])
 app.include_router(data.router, prefix="/api/data", tags=["data"])
@@ -62,6 +72,8 @@ app.include_router(prompt.router, prefix="/api/prompt", tags=["prompt"])
 @app.on_event("startup")
 async def startup_event():
     """Application startup: Start background services"""
+    # 创建数据库表（DS_SKIP_SCHEMA_INIT 可跳过）
+    init_schema()
     print("Starting background services...")
     # Start DataWriter (Simulation Loop)
     data_writer.start()
@@ -76,6 +88,11 @@ async def shutdown_event():
     """Application shutdown: Stop background services"""
     print("Stopping background services...")
     data_writer.stop()
+    # Write out rows still queued by insert_data (the writer thread is a daemon)
+    try:
+        tdengine_service.flush()
+    except Exception as e:
+        print(f"Failed to flush TDengine write queue: {e}")
     mqtt_service.stop()
     modbus_service.stop()
     opcua_service.stop()
@@ -0,0 +1,28 @@
+import sqlite3
+import os
+
+DB_PATH = "device_simulator.db"
+
+def migrate_device_status_index():
+    if not os.path.exists(DB_PATH):
+        print(f"Database {DB_PATH} not found.")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Running devices are looked up by status (DataWriter cache refresh, debug_device_status.py).
+    # New databases get this index from the model (create_all); existing ones need it added here
+    print("Creating index ix_devices_status on devices(status)...")
+    try:
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_devices_status ON devices (status)")
+        conn.commit()
+        print("Migration completed.")
+    except Exception as e:
+        print(f"Error: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_device_status_index()
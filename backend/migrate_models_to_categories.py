@@ -21,7 +21,11 @@ def migrate_models():
         
         print(f"Found {len(models)} simulation models to migrate.")
         
-        migrated_count = 0
+        # Existing category codes, loaded once rather than queried per model (and extended with each new code)
+        cursor.execute("SELECT code FROM categories")
+        existing_codes = {row[0] for row in cursor.fetchall()}
+        
+        rows = []
         
         for model in models:
             m_id, m_name, m_type, m_desc, m_params, m_physics, m_logic = model
@@ -31,32 +35,34 @@ def migrate_models():
             cat_code = slugify(m_name)
             
             # Check if this code already exists
-            cursor.execute("SELECT id FROM categories WHERE code = ?", (cat_code,))
-            existing = cursor.fetchone()
-            
-            if existing:
+            if cat_code in existing_codes:
                 print(f"Category with code '{cat_code}' already exists. Skipping or updating...")
                 # Optional: Update existing category? For now, let's skip to avoid overwriting if manual changes exist.
                 # Or maybe append a suffix?
                 # Let's try to update the existing category with the rich data if it lacks it?
                 # No, safer to create a new one with suffix if needed.
-                cat_code = f"{cat_code}_migrated"
+                base_code = f"{cat_code}_migrated"
+                cat_code = base_code
+                suffix = 2
+                while cat_code in existing_codes:
+                    cat_code = f"{base_code}_{suffix}"
+                    suffix += 1
+            existing_codes.add(cat_code)
             
             print(f"Migrating model '{m_name}' to Category '{m_name}' (Code: {cat_code})...")
             
             new_id = str(uuid.uuid4())
             
-            # Insert into categories
-            # physics_config and logic_rules columns were added in previous migration
-            cursor.execute("""
-                INSERT INTO categories (id, name, code, description, parameters, physics_config, logic_rules, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-            """, (new_id, m_name, cat_code, m_desc, m_params, m_physics, m_logic))
-            
-            migrated_count += 1
+            rows.append((new_id, m_name, cat_code, m_desc, m_params, m_physics, m_logic))
             
+        # Insert into categories: one executemany, one transaction
+        # physics_config and logic_rules columns were added in previous migration
+        cursor.executemany("""
+            INSERT INTO categories (id, name, code, description, parameters, physics_config, logic_rules, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        """, rows)
         conn.commit()
-        print(f"Successfully migrated {migrated_count} models to categories.")
+        print(f"Successfully migrated {len(rows)} models to categories.")
         
     except Exception as e:
         print(f"Error during migration: {e}")
@@ -36,7 +36,7 @@ def migrate_visual_model():
         
         for code, model in updates:
             print(f"Updating {code} -> {model}")
-            cursor.execute("UPDATE categories SET visual_model = ? WHERE code = ?", (model, code))
+        cursor.executemany("UPDATE categories SET visual_model = ? WHERE code = ?", [(model, code) for code, model in updates])
             
     except Exception as e:
         print(f"Error: {e}")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, validator, PrivateAttr
+from typing import List, Optional, Dict, Any, NamedTuple
 from datetime import datetime
 import uuid
 from sqlalchemy import Column, String, Integer, JSON, DateTime
@@ -23,6 +23,60 @@ class DeviceStatus(str, Enum):
     STOPPED = "stopped"
     ERROR = "error"
 
+# Plain str values for hot paths / DB writes (Enums are kept for the API schema only)
+STATUS_RUNNING = DeviceStatus.RUNNING.value
+STATUS_STOPPED = DeviceStatus.STOPPED.value
+STATUS_ERROR = DeviceStatus.ERROR.value
+
+TYPE_NUMBER = ParameterType.NUMBER.value
+TYPE_BOOLEAN = ParameterType.BOOLEAN.value
+TYPE_STRING = ParameterType.STRING.value
+
+# Standard TDengine tags, never written as metric columns
+STANDARD_TAG_IDS = frozenset({"device_id", "device_name", "device_model"})
+
+MODE_RANDOM = GenerationMode.RANDOM.value
+MODE_LINEAR = GenerationMode.LINEAR.value
+MODE_PERIODIC = GenerationMode.PERIODIC.value
+MODE_RANDOM_WALK = GenerationMode.RANDOM_WALK.value
+
+# Error injection features enabled in a CompiledErrorConfig
+ERR_MCAR, ERR_DRIFT, ERR_DRIFT_RESET, ERR_ANOMALY, ERR_NOISE = 1, 2, 4, 8, 16
+
+class CompiledErrorConfig(NamedTuple):
+    """error_config 预编译结果：flags 按位标记启用的特性，未配置的项取中性值"""
+    flags: int
+    mcar_probability: float
+    drift_rate: float
+    drift_reset_interval: float
+    anomaly_probability: float
+    anomaly_multiplier: float
+    noise_std_dev: float
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "CompiledErrorConfig":
+        flags = 0
+        if "mcar_probability" in config:
+            flags |= ERR_MCAR
+        if "drift_rate" in config:
+            flags |= ERR_DRIFT
+            if "drift_reset_interval" in config:
+                flags |= ERR_DRIFT_RESET
+        if "anomaly_probability" in config:
+            flags |= ERR_ANOMALY
+        noise_std_dev = config.get("noise_std_dev", 0.0)
+        if noise_std_dev > 0:
+            flags |= ERR_NOISE
+        return cls(
+            flags=flags,
+            mcar_probability=config.get("mcar_probability", 0.0),
+            drift_rate=config.get("drift_rate", 0.0),
+            drift_reset_interval=config.get("drift_reset_interval", float("inf")),
+            anomaly_probability=config.get("anomaly_probability", 0.0),
+            anomaly_multiplier=config.get("anomaly_multiplier", 1.5),
+            noise_std_dev=noise_std_dev if flags & ERR_NOISE else 0.0,
+        )
+
 class Parameter(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -37,6 +91,17 @@ class Parameter(BaseModel):
     is_tag: bool = False # TDengine: true for TAG, false for COLUMN
     is_integer: bool = False # Force integer values for NUMBER type
 
+    _compiled_error_config: Optional[CompiledErrorConfig] = PrivateAttr(default=None)
+
+    class Config:
+        use_enum_values = True # Store plain str values, no Enum boxing per access
+
+    @property
+    def compiled_error_config(self) -> CompiledErrorConfig:
+        """error_config compiled once per loaded parameter"""
+        if self._compiled_error_config is None:
+            self._compiled_error_config = CompiledErrorConfig.from_dict(self.error_config)
+        return self._compiled_error_config
 
     @validator('max_value')
     def validate_max_value(cls, v, values):
@@ -64,6 +129,29 @@ class Device(BaseModel):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
+    # Structural caches, computed once per loaded device (devices are reloaded on config change)
+    _tag_ids: Optional[frozenset] = PrivateAttr(default=None)
+    _metric_ids: Optional[List[str]] = PrivateAttr(default=None)
+
+    class Config:
+        use_enum_values = True
+
+    @property
+    def tag_ids(self) -> frozenset:
+        """TDengine TAG parameter ids, including the standard tags"""
+        if self._tag_ids is None:
+            # parameters are always validated into Parameter models, so no dict/hasattr dispatch
+            self._tag_ids = STANDARD_TAG_IDS.union(p.id for p in self.parameters if p.is_tag)
+        return self._tag_ids
+
+    @property
+    def metric_ids(self) -> List[str]:
+        """Parameter ids written as TDengine metric columns (non-tag), in parameter order"""
+        if self._metric_ids is None:
+            tag_ids = self.tag_ids
+            self._metric_ids = [p.id for p in self.parameters if p.id not in tag_ids]
+        return self._metric_ids
+
 class DeviceInDB(Device):
     class Config:
         from_attributes = True
@@ -79,7 +167,7 @@ class DeviceDB(Base):
     description = Column(String, nullable=True)
     parameters = Column(JSON)
     sampling_rate = Column(Integer, default=1000)
-    status = Column(String, default="stopped")
+    status = Column(String, default=STATUS_STOPPED, index=True) # ix_devices_status (existing DBs: migrate_device_status_index.py)
     physics_config = Column(JSON, default={}) # Add physics_config
     logic_rules = Column(JSON, default=[]) # Add logic_rules
     scenarios = Column(JSON, default=["Normal", "High Load", "Error State"])
@@ -1,9 +1,9 @@
 import sys
 import os
 import multiprocessing
-import uvicorn
 import argparse
 import shutil
+import importlib.util
 
 # Ensure backend directory is in sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -38,7 +38,9 @@ def setup_environment():
             if os.path.exists(source_db):
                 print(f"Copying default database from {source_db} to {target_db}")
                 try:
-                    shutil.copy2(source_db, target_db)
+                    # Fresh seed: no need to preserve metadata (copy2 -> copystat)
+                    shutil.copyfile(source_db, target_db)
+                    os.utime(target_db, None)
                 except Exception as e:
                     print(f"Failed to copy database: {e}")
             else:
@@ -63,6 +65,10 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=8000, help="Port to run the server on")
     args = parser.parse_args()
     
+    # Heavy imports are deferred until after argument parsing, so --help / bad args
+    # exit without paying the uvicorn (h11, websockets, starlette) import cost
+    import uvicorn
+    
     # Import app AFTER setting up environment so config.py reads the env vars
     try:
         print("Importing app...", flush=True)
@@ -75,4 +81,7 @@ if __name__ == "__main__":
     print(f"Starting server on port {args.port}...")
     # Cannot use reload=True in frozen app
     # Use 0.0.0.0 to ensure accessibility
-    uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="info")
+    # Prefer uvloop + httptools when bundled; uvloop is unavailable on Windows
+    loop = "uvloop" if sys.platform != "win32" and importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="info", loop=loop, http=http, access_log=False)
@@ -4,25 +4,26 @@ import os
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "device_simulator.db")
 
 def add_visual_config_column():
-    conn = sqlite3.connect(DB_PATH)
+    # Autocommit mode: the single DDL statement commits on its own
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
     cursor = conn.cursor()
     
     try:
-        # Check if column exists
-        cursor.execute("PRAGMA table_info(simulation_models)")
-        columns = [info[1] for info in cursor.fetchall()]
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
         
-        if 'visual_config' not in columns:
+        # Idempotent ALTER: attempt the add and treat "duplicate column" as already done
+        try:
             print("Adding 'visual_config' column to 'simulation_models' table...")
             cursor.execute("ALTER TABLE simulation_models ADD COLUMN visual_config JSON DEFAULT '{}'")
-            conn.commit()
             print("Column added successfully.")
-        else:
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e):
+                raise
             print("'visual_config' column already exists.")
             
     except Exception as e:
         print(f"Error: {e}")
-        conn.rollback()
     finally:
         conn.close()
 
@@ -3,12 +3,14 @@ from sqlalchemy.orm import Session
 from services.database_service import SessionLocal
 from models.config import TDengineConfig, SystemSettings
 import json
+from utils.logger import logger
 
 class ConfigService:
     """配置管理服务"""
     
-    _config_cache = None
-    _cache_timestamp = None
+    _config_cache = None # TDengine config dict; None = reload from DB
+    _config_version = 0 # Bumped by update_tdengine_config
+    _settings_cache = None # System settings dict; None = reload from DB
     
     @staticmethod
     def _get_db() -> Session:
@@ -17,25 +19,27 @@ class ConfigService:
     
     @staticmethod
     def get_tdengine_config() -> Dict[str, Any]:
-        """获取TDengine配置（优先使用数据库配置）"""
+        """获取TDengine配置（优先使用数据库配置，结果缓存至 update_tdengine_config 清除）"""
+        if ConfigService._config_cache is not None:
+            return dict(ConfigService._config_cache)
+        
         db = ConfigService._get_db()
         try:
             # 查询数据库中的配置
             config = db.query(TDengineConfig).first()
             
-            if config:
-                # 返回数据库中的配置
-                return config.to_dict()
-            else:
+            if not config:
                 # 如果没有配置，创建默认配置
                 default_config = TDengineConfig.get_default_config()
-                new_config = TDengineConfig(**default_config)
-                db.add(new_config)
+                config = TDengineConfig(**default_config)
+                db.add(config)
                 db.commit()
-                return new_config.to_dict()
+            
+            ConfigService._config_cache = config.to_dict()
+            return dict(ConfigService._config_cache)
                 
         except Exception as e:
-            print(f"获取TDengine配置失败: {e}")
+            logger.error("获取TDengine配置失败: %s", e)
             # 如果数据库操作失败，返回默认配置
             return TDengineConfig.get_default_config()
         finally:
@@ -66,16 +70,22 @@ class ConfigService:
             
             # 清除缓存
             ConfigService._config_cache = None
+            ConfigService._config_version += 1
             
             return True
             
         except Exception as e:
-            print(f"更新TDengine配置失败: {e}")
+            logger.error("更新TDengine配置失败: %s", e)
             db.rollback()
             return False
         finally:
             db.close()
     
+    @staticmethod
+    def get_tdengine_config_version() -> Optional[int]:
+        """TDengine配置版本号（每次更新递增）；配置尚未从数据库成功加载时返回 None"""
+        return ConfigService._config_version if ConfigService._config_cache is not None else None
+    
     @staticmethod
     def is_tdengine_enabled() -> bool:
         """检查TDengine是否启用"""
@@ -96,7 +106,10 @@ class ConfigService:
 
     @staticmethod
     def get_system_settings() -> Dict[str, Any]:
-        """获取系统全局配置"""
+        """获取系统全局配置（结果缓存至 update_system_settings 清除）"""
+        if ConfigService._settings_cache is not None:
+            return dict(ConfigService._settings_cache)
+        
         db = ConfigService._get_db()
         try:
             config = db.query(SystemSettings).first()
@@ -105,9 +118,10 @@ class ConfigService:
                 db.add(config)
                 db.commit()
                 db.refresh(config)
-            return config.to_dict()
+            ConfigService._settings_cache = config.to_dict()
+            return dict(ConfigService._settings_cache)
         except Exception as e:
-            print(f"获取系统配置失败: {e}")
+            logger.error("获取系统配置失败: %s", e)
             return SystemSettings().to_dict() # Default
         finally:
             db.close()
@@ -139,9 +153,13 @@ class ConfigService:
             if "timezone" in settings_data: config.timezone = settings_data["timezone"]
 
             db.commit()
+            
+            # 清除缓存
+            ConfigService._settings_cache = None
+            
             return True
         except Exception as e:
-            print(f"更新系统配置失败: {e}")
+            logger.error("更新系统配置失败: %s", e)
             db.rollback()
             return False
         finally:
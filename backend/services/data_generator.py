@@ -4,9 +4,7 @@ from typing import Any, Dict
 from models.device import Parameter, ParameterType, GenerationMode
 from services.simulation_engine import (
     StrategyFactory, 
-    ErrorInjector, 
     PhysicsEngine, 
-    LogicEngine,
     SimulationStateManager
 )
 
@@ -19,22 +17,25 @@ class DataGenerator:
         device_state = SimulationStateManager.get_state(device_id)
         
         # 2. Generate Basic Values
-        generated_data = {}
+        rng = device_state.rng
         
-        for param in parameters:
-            # Get persistent state for this parameter
-            if param.id not in device_state.parameter_states:
+        # Numeric RANDOM / LINEAR / PERIODIC / RANDOM_WALK parameters are generated in vectorized batches
+        batch = device_state.get_batch(parameters)
+        # Pre-sized from the cached name tuple; every slot is filled below
+        generated_data = dict.fromkeys(batch.param_names)
+        batch.generate(rng, generated_data)
+        
+        states = device_state.parameter_states
+        for param, strategy in zip(batch.scalar_params, batch.scalar_strategies):
+            # Get persistent state for this parameter (single lookup on the fast path)
+            param_state = states.get(param.id)
+            if param_state is None:
                 # Initialize with default params from configuration
                 # Ensure generation_params is not None
-                device_state.parameter_states[param.id] = (param.generation_params or {}).copy()
-            
-            param_state = device_state.parameter_states[param.id]
-            
-            # Get Strategy
-            strategy = StrategyFactory.get_strategy(param.generation_mode)
+                param_state = states[param.id] = (param.generation_params or {}).copy()
             
             # Generate Value
-            value = strategy.generate(param, param_state)
+            value = strategy.generate(param, param_state, rng)
             
             generated_data[param.name] = value # Use name for logic engine context, but id for result?
             # Result should use ID or Name? 
@@ -54,28 +55,18 @@ class DataGenerator:
         if logic_rules:
             # Context includes generated values + physics state
             context = generated_data.copy()
-            updates = LogicEngine.evaluate(context, logic_rules)
+            updates = device_state.get_logic_engine(logic_rules).run(context)
             
             # Apply updates back to generated_data
             for key, val in updates.items():
                 generated_data[key] = val
                 
         # 5. Apply Error Injection & Format Result
-        final_data = {}
-        for param in parameters:
-            # Retrieve value (might have been updated by logic)
-            value = generated_data.get(param.name)
-            
-            # Apply Error Injection
-            if param.error_config:
-                if param.id not in device_state.error_context:
-                    device_state.error_context[param.id] = {}
-                
-                error_ctx = device_state.error_context[param.id]
-                value = ErrorInjector.apply(value, param.error_config, error_ctx)
-            
-            final_data[param.id] = value
-            
+        # Values may have been updated by logic; errors are applied over the batch's arrays
+        # (one draw per anomaly/MCAR decision and noise sample of this tick), then mapped to ids
+        batch.apply_errors(generated_data, rng, time.monotonic())
+        final_data = batch.build_output(generated_data)
+        
         ts = timestamp if timestamp else datetime.utcnow()
         return {
             "device_id": device_id,
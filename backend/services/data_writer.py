@@ -1,14 +1,18 @@
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Any
-from models.device import Device
+from models.device import Device, STATUS_RUNNING
 from services.device_service import DeviceService
 from services.tdengine_service import tdengine_service
 from services.data_generator import DataGenerator
+from services.simulation_engine import warmup_kernels
+from services.simulation_shards import ShardedSimulation
 from services.config_service import ConfigService
 from services.protocols.mqtt_service import mqtt_service
 from services.protocols.modbus_service import modbus_service
 from services.protocols.opcua_service import opcua_service
+from config.config import settings
 from utils.logger import logger
 
 class DataWriter:
@@ -18,14 +22,31 @@ class DataWriter:
         self.device_service = DeviceService()
         self.interval = 1.0 # Default 1s
         self._device_cache = []
-        self._last_cache_update = 0
+        self._last_cache_update = float("-inf") # monotonic
         self._cache_ttl = 5.0 # Update cache every 5 seconds
+        self._idle_log_interval = 5.0
+        self._next_idle_log = 0.0 # monotonic deadline of the next "no running devices" log
+        self._min_interval = 0.1 # Fastest supported per-device sampling interval (s)
+        self._next_due: Dict[str, float] = {} # device_id -> next monotonic deadline
+        self._stop_event = threading.Event() # Interrupts scheduler waits on stop()
+        # Per-device generate + I/O fan-out (TDengine / MQTT / Modbus / OPC UA writes are I/O-bound)
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="DataWriter")
+        # Optional multi-process generation (settings.simulation_processes > 0); protocol I/O stays in this process
+        self._shards = None
     
     def start(self):
         """启动数据写入服务"""
         if not self.running:
             # Services are now managed by main application lifecycle
             logger.info("Starting DataWriter service...")
+            # Pay JIT compile cost once, before the first tick
+            warmup_kernels()
+            if settings.simulation_processes > 0:
+                logger.info("Sharding device simulation across %s processes", settings.simulation_processes)
+                self._shards = ShardedSimulation(settings.simulation_processes)
+            # TDengine connectivity is tracked off the tick path
+            tdengine_service.start_health_check()
+            self._stop_event.clear()
             self.running = True
             self.thread = threading.Thread(target=self._write_data_loop)
             self.thread.daemon = True
@@ -38,112 +59,157 @@ class DataWriter:
         if self.running:
             logger.info("Stopping DataWriter service...")
             self.running = False
+            self._stop_event.set()
             if self.thread:
                 self.thread.join()
+            if self._shards is not None:
+                self._shards.shutdown()
+                self._shards = None
+            tdengine_service.stop_health_check()
             return True
         return False
 
     def _write_data_loop(self):
-        """数据写入循环"""
+        """数据写入循环：按各设备采样频率调度（monotonic 时钟，事件唤醒）"""
         logger.info("DataWriter loop started")
         while self.running:
-            loop_start = time.time()
             try:
                 # 1. 获取所有运行中的设备 (with caching)
-                current_time = time.time()
+                current_time = time.monotonic()
                 if current_time - self._last_cache_update > self._cache_ttl:
                     # Refresh cache
                     try:
-                        all_devices = self.device_service.get_all_devices()
-                        self._device_cache = [d for d in all_devices if d.status == "running"]
+                        self._device_cache = self.device_service.get_devices_by_status(STATUS_RUNNING)
                         self._last_cache_update = current_time
+                        # Forget deadlines of devices that are no longer running
+                        running_ids = {d.id for d in self._device_cache}
+                        self._next_due = {k: v for k, v in self._next_due.items() if k in running_ids}
                     except Exception as e:
-                        logger.error(f"Error updating device cache: {e}")
+                        logger.error("Error updating device cache: %s", e)
                 
                 if not self._device_cache:
-                    time.sleep(1)
+                    if current_time >= self._next_idle_log:
+                        logger.debug("No running devices")
+                        self._next_idle_log = current_time + self._idle_log_interval
+                    self._stop_event.wait(1)
                     continue
                 
-                self.process_devices(self._device_cache)
+                # 2. Process every device whose deadline has passed, as one batch
+                due_devices = self._collect_due_devices(time.monotonic())
+                if due_devices:
+                    self.process_devices(due_devices)
                 
-                # Maintain loop frequency
-                elapsed = time.time() - loop_start
-                sleep_time = max(0.1, self.interval - elapsed)
-                time.sleep(sleep_time)
+                # 3. Sleep until the earliest next deadline (or until stop())
+                next_deadline = min(self._next_due.values())
+                self._stop_event.wait(max(0.0, next_deadline - time.monotonic()))
                 
             except Exception as e:
-                logger.error(f"DataWriter loop error: {e}")
-                time.sleep(1)
+                logger.error("DataWriter loop error: %s", e)
+                self._stop_event.wait(1)
+
+    def _collect_due_devices(self, now: float) -> List[Device]:
+        """返回已到期的设备，并推进其下一次调度时间"""
+        due_devices = []
+        for device in self._device_cache:
+            interval = max(self._min_interval, (device.sampling_rate or self.interval * 1000) / 1000.0)
+            deadline = self._next_due.get(device.id)
+            if deadline is None or deadline <= now:
+                due_devices.append(device)
+                # Stay on a fixed grid (no drift); if we fell behind, skip missed slots instead of bursting
+                if deadline is None or now - deadline > interval:
+                    deadline = now
+                self._next_due[device.id] = deadline + interval
+        return due_devices
 
     def process_devices(self, devices: List[Device]):
         """
         生成并写入数据的主入口
         """
         try:
-            # 检查TDengine连接（如果启用）
-            tdengine_connected = False
-            if ConfigService.is_tdengine_enabled():
-                if tdengine_service.check_connection():
-                    tdengine_connected = True
-                else:
-                    # logger.warning("TDengine connection failed, skipping write") 
-                    pass
+            # TDengine状态：配置已缓存，连接由健康检查线程维护（无每tick往返）
+            tdengine_connected = ConfigService.is_tdengine_enabled() and tdengine_service.connected
 
-            for device in devices:
-                # 生成数据
-                data = DataGenerator.generate_device_data(
-                    device.id, 
-                    device.parameters, 
-                    device.physics_config if hasattr(device, 'physics_config') else None,
-                    device.logic_rules if hasattr(device, 'logic_rules') else None
-                )
-                
-                # 1. 如果TDengine启用且连接成功，写入TDengine
-                if tdengine_connected:
-                    try:
-                        # Filter out TAGS from data payload for TDengine insertion
-                        td_data = data.copy()
-                        td_data["data"] = {}
-                        
-                        tag_ids = set()
-                        for p in device.parameters:
-                            # Check is_tag (Pydantic model or dict)
-                            is_tag = False
-                            if isinstance(p, dict):
-                                is_tag = p.get('is_tag', False)
-                            elif hasattr(p, 'is_tag'):
-                                is_tag = p.is_tag
-                            
-                            if is_tag:
-                                p_id = p.get('id') if isinstance(p, dict) else p.id
-                                if p_id: tag_ids.add(p_id)
-                        
-                        # Also add standard tags to exclusion list
-                        tag_ids.add('device_id')
-                        tag_ids.add('device_name')
-                        tag_ids.add('device_model')
+            if self._shards is not None:
+                # CPU-bound generation runs in the shard processes (one round-trip per shard), delivery here
+                devices_by_id = {device.id: device for device in devices}
+                futures = []
+                for device_id, data, error in self._shards.generate(devices):
+                    if error is not None:
+                        logger.error("DataWriter device %s generation failed: %s", device_id, error)
+                        continue
+                    futures.append(self._pool.submit(self._deliver_device, devices_by_id[device_id], data, tdengine_connected))
+            else:
+                futures = [self._pool.submit(self._process_one_device, device, tdengine_connected) for device in devices]
+            wait(futures)
+            
+            # Collect per-device results and flush TDengine / MQTT once per tick
+            td_rows = []
+            mqtt_messages = []
+            for future in futures:
+                if future.exception():
+                    logger.error("DataWriter device processing failed: %s", future.exception())
+                    continue
+                device_id, data, td_data = future.result()
+                mqtt_messages.append((device_id, data))
+                if td_data:
+                    td_rows.append((device_id, td_data))
+            
+            # MQTT publishing (paho enqueue) overlaps the TDengine round-trip; both finish within the tick
+            mqtt_future = self._pool.submit(mqtt_service.publish_many, mqtt_messages)
+            
+            if td_rows:
+                try:
+                    tdengine_service.multi_table_insert(td_rows, {device.id: device.type for device in devices})
+                except Exception as e:
+                    logger.error("TDengine batch write failed: %s", e)
+            
+            if mqtt_future.exception():
+                logger.error("MQTT batch publish failed: %s", mqtt_future.exception())
 
-                        for k, v in data["data"].items():
-                            if k not in tag_ids:
-                                td_data["data"][k] = v
-                        
-                        # Only insert if there are metrics (columns) to insert
-                        if td_data["data"]:
-                            tdengine_service.insert_data(device.id, td_data)
-                    except Exception as e:
-                        logger.error(f"Device {device.name} TDengine write failed: {e}")
-                
-                # 2. 推送 MQTT
-                mqtt_service.publish(device.id, data)
-                
-                # 3. 更新 Modbus
-                modbus_service.update(device.id, data["data"], device.parameters)
+        except Exception as e:
+            logger.error("DataWriter process exception: %s", e)
 
-                # 4. 更新 OPC UA
-                opcua_service.update(device.id, data["data"], device.parameters)
+    def _process_one_device(self, device: Device, tdengine_connected: bool):
+        """
+        生成单个设备的数据并更新 Modbus / OPC UA
+        返回 (device_id, data, td_data)，TDengine 与 MQTT 由 process_devices 批量写入
+        """
+        # 生成数据
+        # physics_config / logic_rules are always present on Device (normalized in DeviceService)
+        data = DataGenerator.generate_device_data(
+            device.id, 
+            device.parameters, 
+            device.physics_config,
+            device.logic_rules
+        )
+        return self._deliver_device(device, data, tdengine_connected)
 
-        except Exception as e:
-            logger.error(f"DataWriter process exception: {e}")
+    def _deliver_device(self, device: Device, data: Dict[str, Any], tdengine_connected: bool):
+        """
+        更新单个设备的 Modbus / OPC UA，并准备 TDengine 写入数据
+        返回 (device_id, data, td_data)
+        """
+        td_data = None
+        # 1. 如果TDengine启用且连接成功，准备TDengine写入数据
+        if tdengine_connected:
+            try:
+                # Metrics-only payload built directly (no envelope copy); tag / metric ids are cached on the device
+                values = data["data"]
+                metrics = {k: values[k] for k in device.metric_ids if k in values}
+
+                # Only insert if there are metrics (columns) to insert
+                if metrics:
+                    td_data = {"device_id": data["device_id"], "timestamp": data["timestamp"], "data": metrics}
+            except Exception as e:
+                logger.error("Device %s TDengine payload preparation failed: %s", device.name, e)
+
+        # 2. 更新 Modbus
+        modbus_service.update(device.id, data["data"], device.parameters)
+
+        # 3. 更新 OPC UA
+        opcua_service.update(device.id, data["data"], device.parameters)
+
+        return device.id, data, td_data
 
 # 创建全局数据写入服务实例
 data_writer = DataWriter()
@@ -1,23 +1,98 @@
-from sqlalchemy import create_engine
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 from config.config import settings
 
-# 创建SQLAlchemy引擎
+# orjson is optional: JSON 列的解码（每行每个 JSON 字段一次）
+try:
+    import orjson
+    def json_loads(raw):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return json.loads(raw) # NaN / Infinity written by json.dumps
+except ImportError:
+    json_loads = json.loads
+
+_is_sqlite = settings.database_url.startswith("sqlite")
+
+# 创建SQLAlchemy引擎（LIFO 连接池：优先复用热连接，多余的空闲连接自然超时）
 engine = create_engine(
-    settings.database_url, connect_args={"check_same_thread": False}
+    settings.database_url,
+    connect_args={"check_same_thread": False} if _is_sqlite else {},
+    poolclass=QueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=True,
+    pool_use_lifo=True,
+    json_deserializer=json_loads,
 )
 
+if _is_sqlite:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: 读写不互斥；synchronous=NORMAL 在 WAL 下足够安全
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 # 创建SessionLocal类，每个实例将是一个数据库会话
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 请求级会话：HTTP 请求内（见 main.py 中间件）所有服务调用共享一个会话/连接；
+# 请求之外（DataWriter 等后台线程）按线程划分，由 release_session() 每次关闭
+_session_scope: ContextVar[Optional[object]] = ContextVar("db_session_scope", default=None)
+
+def _scopefunc():
+    # contextvars are copied into FastAPI's threadpool, so sync endpoints see the request scope
+    scope = _session_scope.get()
+    return scope if scope is not None else threading.get_ident()
+
+ScopedSession = scoped_session(SessionLocal, scopefunc=_scopefunc)
+
+@contextmanager
+def request_session_scope():
+    """包裹一次HTTP请求：请求结束时关闭并移除该请求的会话"""
+    token = _session_scope.set(object())
+    try:
+        yield
+    finally:
+        ScopedSession.remove()
+        _session_scope.reset(token)
+
+def release_session():
+    """服务方法结束时调用：请求内保留会话（由中间件移除），请求外立即关闭"""
+    if _session_scope.get() is None:
+        ScopedSession.remove()
+
 # 创建Base类，所有模型类都将继承自这个类
 from models.base import Base
 
+def init_schema():
+    """
+    创建缺失的数据库表（应用启动时调用，而非模块导入时）。
+    设置环境变量 DS_SKIP_SCHEMA_INIT=1 可跳过（例如由迁移工具管理表结构的部署）。
+    """
+    if os.environ.get("DS_SKIP_SCHEMA_INIT"):
+        return
+    # Register every model on Base.metadata before create_all
+    import models.device, models.category, models.config, models.prompt, models.simulation_model  # noqa: F401
+    Base.metadata.create_all(bind=engine)
+
 # 依赖项，用于获取数据库会话
 def get_db():
-    db = SessionLocal()
+    db = ScopedSession()
     try:
         yield db
     finally:
-        db.close()
+        release_session()
@@ -1,101 +1,114 @@
-from typing import List, Optional
-from models.device import Device, DeviceDB
+from typing import List, Optional, Tuple
+from models.device import Device, DeviceDB, Parameter
 from models.category import CategoryDB
-from services.database_service import SessionLocal, engine
+from services.database_service import ScopedSession, release_session
 from services.tdengine_service import tdengine_service
 from services.config_service import ConfigService
 from services.simulation_engine import SimulationStateManager
+from utils.logger import logger
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
+import functools
 import json
+# orjson is optional: faster (de)serialization of the parameters column
+try:
+    import orjson
+    _json_loads = orjson.loads
+    def _encode_parameters(parameters: List[Parameter]) -> str:
+        return orjson.dumps(parameters, default=lambda p: p.dict()).decode()
+except ImportError:
+    _json_loads = json.loads
+    def _encode_parameters(parameters: List[Parameter]) -> str:
+        return json.dumps([param.dict() for param in parameters])
 
-# 创建数据库表
-from models.device import Base
-Base.metadata.create_all(bind=engine)
+@functools.lru_cache(maxsize=1024)
+def _decode_parameters(device_id: str, raw: str) -> Tuple[Parameter, ...]:
+    """
+    解析设备 parameters 列（JSON字符串）为 Parameter 元组，按 (device_id, 原始JSON) 缓存。
+    以原始JSON而非 updated_at 作为键：update_device 会写入客户端提交的 updated_at，不保证变化。
+    """
+    return tuple(Parameter(**p) for p in _json_loads(raw))
 
 class DeviceService:
     @staticmethod
     def _get_db() -> Session:
-        """获取数据库会话"""
-        return SessionLocal()
+        """获取数据库会话（HTTP请求内共享同一会话）"""
+        return ScopedSession()
+    
+    @staticmethod
+    def _db_to_pydantic(device_db: DeviceDB, visual_model: Optional[str]) -> Device:
+        """DeviceDB -> Device（visual_model 来自分类表）"""
+        # 将JSON字符串转换为参数列表（解析结果缓存）
+        parameters = device_db.parameters
+        if isinstance(parameters, str):
+            parameters = _decode_parameters(device_db.id, parameters)
+        
+        return Device(
+            id=device_db.id,
+            name=device_db.name,
+            type=device_db.type,
+            model=device_db.model,
+            description=device_db.description,
+            visual_model=visual_model if visual_model is not None else "Generic", # Map visual_model
+            parameters=parameters,
+            sampling_rate=device_db.sampling_rate,
+            status=device_db.status,
+            physics_config=device_db.physics_config if device_db.physics_config else {},
+            logic_rules=device_db.logic_rules if device_db.logic_rules else [],
+            scenarios=device_db.scenarios if device_db.scenarios else ["Normal", "High Load", "Error State"],
+            scenario_configs=device_db.scenario_configs if device_db.scenario_configs else {},
+            current_scenario=device_db.current_scenario,
+            created_at=device_db.created_at,
+            updated_at=device_db.updated_at
+        )
+    
+    @staticmethod
+    def _query_with_visual_model(db: Session):
+        """设备 + 分类 visual_model，一次 LEFT JOIN 查询"""
+        return db.query(DeviceDB, CategoryDB.visual_model).outerjoin(CategoryDB, CategoryDB.code == DeviceDB.type)
     
     @staticmethod
     def get_all_devices() -> List[Device]:
         """获取所有设备"""
         db = DeviceService._get_db()
         try:
-            device_dbs = db.query(DeviceDB).all()
-            # Pre-fetch all categories to map visual_model
-            categories = db.query(CategoryDB).all()
-            cat_map = {cat.code: cat.visual_model for cat in categories}
-            
-            devices = []
-            for device_db in device_dbs:
-                # 将JSON字符串转换为参数列表
-                parameters = device_db.parameters
-                if isinstance(parameters, str):
-                    parameters = json.loads(parameters)
-                
-                device = Device(
-                    id=device_db.id,
-                    name=device_db.name,
-                    type=device_db.type,
-                    model=device_db.model,
-                    description=device_db.description,
-                    visual_model=cat_map.get(device_db.type, "Generic"), # Map visual_model
-                    parameters=parameters,
-                    sampling_rate=device_db.sampling_rate,
-                    status=device_db.status,
-                    physics_config=device_db.physics_config if device_db.physics_config else {},
-                    logic_rules=device_db.logic_rules if device_db.logic_rules else [],
-                    scenarios=device_db.scenarios if device_db.scenarios else ["Normal", "High Load", "Error State"],
-                    scenario_configs=device_db.scenario_configs if device_db.scenario_configs else {},
-                    current_scenario=device_db.current_scenario,
-                    created_at=device_db.created_at,
-                    updated_at=device_db.updated_at
-                )
-                devices.append(device)
-            return devices
+            rows = DeviceService._query_with_visual_model(db).all()
+            return [DeviceService._db_to_pydantic(device_db, visual_model) for device_db, visual_model in rows]
+        finally:
+            release_session()
+    
+    @staticmethod
+    def get_devices_by_status(status: str) -> List[Device]:
+        """获取指定状态的设备（WHERE status = ?，走 ix_devices_status 索引）"""
+        db = DeviceService._get_db()
+        try:
+            rows = DeviceService._query_with_visual_model(db).filter(DeviceDB.status == status).all()
+            return [DeviceService._db_to_pydantic(device_db, visual_model) for device_db, visual_model in rows]
+        finally:
+            release_session()
+    
+    @staticmethod
+    def count_devices() -> int:
+        """设备总数（SELECT COUNT(*)，不加载设备行）"""
+        db = DeviceService._get_db()
+        try:
+            return db.query(func.count(DeviceDB.id)).scalar()
         finally:
-            db.close()
+            release_session()
     
     @staticmethod
     def get_device_by_id(device_id: str) -> Optional[Device]:
         """根据ID获取设备"""
         db = DeviceService._get_db()
         try:
-            device_db = db.query(DeviceDB).filter(DeviceDB.id == device_id).first()
-            if not device_db:
+            row = DeviceService._query_with_visual_model(db).filter(DeviceDB.id == device_id).one_or_none()
+            if not row:
                 return None
             
-            # Get category for visual_model
-            category = db.query(CategoryDB).filter(CategoryDB.code == device_db.type).first()
-            visual_model = category.visual_model if category else "Generic"
-
-            # 将JSON字符串转换为参数列表
-            parameters = device_db.parameters
-            if isinstance(parameters, str):
-                parameters = json.loads(parameters)
-            
-            return Device(
-                id=device_db.id,
-                name=device_db.name,
-                type=device_db.type,
-                model=device_db.model,
-                description=device_db.description,
-                visual_model=visual_model, # Map visual_model
-                parameters=parameters,
-                sampling_rate=device_db.sampling_rate,
-                status=device_db.status,
-                physics_config=device_db.physics_config if device_db.physics_config else {},
-                logic_rules=device_db.logic_rules if device_db.logic_rules else [],
-                scenarios=device_db.scenarios if device_db.scenarios else ["Normal", "High Load", "Error State"],
-                scenario_configs=device_db.scenario_configs if device_db.scenario_configs else {},
-                current_scenario=device_db.current_scenario,
-                created_at=device_db.created_at,
-                updated_at=device_db.updated_at
-            )
+            device_db, visual_model = row
+            return DeviceService._db_to_pydantic(device_db, visual_model)
         finally:
-            db.close()
+            release_session()
     
     @staticmethod
     def create_device(device: Device) -> Device:
@@ -117,7 +130,7 @@ class DeviceService:
                     param.default_value = device.name
 
             # 将参数列表转换为JSON字符串
-            parameters_json = json.dumps([param.dict() for param in device.parameters])
+            parameters_json = _encode_parameters(device.parameters)
             
             # 创建数据库设备对象
             device_db = DeviceDB(
@@ -145,18 +158,18 @@ class DeviceService:
             # 为设备创建TDengine表（如果TDengine启用）
             if ConfigService.is_tdengine_enabled():
                 try:
-                    print(f"尝试为设备 {device.name} (ID: {device.id}) 创建TDengine表...")
+                    logger.debug("尝试为设备 %s (ID: %s) 创建TDengine表...", device.name, device.id)
                     # 使用设备类型作为超级表名称 (设备类型即为Category Code)
                     st_name = device.type
-                    print(f"使用超级表: {st_name}")
+                    logger.debug("使用超级表: %s", st_name)
                     
                     # 创建超级表（如果不存在）
                     # 注意：通常超级表应该在创建分类时创建，这里作为保险措施
                     try:
                         tdengine_service.create_super_table(st_name, device.parameters)
-                        print(f"检查/创建超级表 {st_name} 完成")
+                        logger.debug("检查/创建超级表 %s 完成", st_name)
                     except Exception as e:
-                        print(f"检查超级表失败 (可能已存在): {e}")
+                        logger.warning("检查超级表失败 (可能已存在): %s", e)
 
                     # Create sub-table
                     sub_table_name = f"`device_{device.id}`"
@@ -167,34 +180,31 @@ class DeviceService:
                     
                     # Extract custom tags from parameters
                     for param in device.parameters:
-                        if hasattr(param, 'is_tag') and param.is_tag:
+                        if param.is_tag:
                             p_id = param.id
                             # Don't overwrite standard tags
                             if p_id in ["device_name", "device_model"]:
                                 continue
                             tags[p_id] = param.default_value
 
-                    print(f"正在创建子表: {sub_table_name} tags={tags}")
+                    logger.debug("正在创建子表: %s tags=%s", sub_table_name, tags)
                     result = tdengine_service.create_sub_table(st_name, sub_table_name, tags)
                     if result:
-                        print(f"TDengine子表 {sub_table_name} 创建成功")
+                        logger.debug("TDengine子表 %s 创建成功", sub_table_name)
                     else:
-                        print(f"TDengine子表 {sub_table_name} 创建失败 (返回False)")
+                        logger.error("TDengine子表 %s 创建失败 (返回False)", sub_table_name)
                     
                     # 兼容旧代码，保留create_table_for_device如果需要，或者直接替换
                     # tdengine_service.create_table_for_device(device)
                 except Exception as e:
-                    print(f"TDengine表创建过程中发生异常: {e}")
-                    import traceback
-                    traceback.print_exc()
                     # 不抛出异常，以免影响设备创建的主流程
-                    print(f"TDengine表创建失败，但设备数据已保存到SQLite")
+                    logger.exception("TDengine表创建过程中发生异常: %s，但设备数据已保存到SQLite", e)
             
             # Re-fetch to get visual_model? Or just return input device (which might lack it)
             # Better: manually set it if needed, but frontend usually refreshes list.
             return device
         finally:
-            db.close()
+            release_session()
     
     @staticmethod
     def update_device(device_id: str, device: Device) -> Optional[Device]:
@@ -219,14 +229,16 @@ class DeviceService:
                     param.default_value = device.name
 
             # 将参数列表转换为JSON字符串
-            parameters_json = json.dumps([param.dict() for param in device.parameters])
+            parameters_json = _encode_parameters(device.parameters)
             
             # 更新数据库设备对象
             existing_device.name = device.name
             existing_device.type = device.type
             existing_device.model = device.model
             existing_device.description = device.description
-            existing_device.parameters = parameters_json
+            # Unchanged parameter list (the common case) leaves the column out of the UPDATE
+            if parameters_json != existing_device.parameters:
+                existing_device.parameters = parameters_json
             existing_device.sampling_rate = device.sampling_rate
             existing_device.status = device.status
             existing_device.physics_config = device.physics_config
@@ -236,8 +248,8 @@ class DeviceService:
             existing_device.scenario_configs = device.scenario_configs
             existing_device.updated_at = device.updated_at
             
+            # No refresh: the returned value is the input device, which already carries every written field
             db.commit()
-            db.refresh(existing_device)
             
             # 更新TDengine表结构（如果TDengine启用）
             if ConfigService.is_tdengine_enabled():
@@ -259,7 +271,7 @@ class DeviceService:
                         
                         # Extract custom tags from parameters
                         for param in device.parameters:
-                            if hasattr(param, 'is_tag') and param.is_tag:
+                            if param.is_tag:
                                 p_id = param.id
                                 # Don't overwrite standard tags
                                 if p_id in ["device_name", "device_model"]:
@@ -270,11 +282,11 @@ class DeviceService:
                     else:
                         tdengine_service.create_table_for_device(device)
                 except Exception as e:
-                    print(f"TDengine表更新失败: {e}，但设备数据已更新到SQLite")
+                    logger.error("TDengine表更新失败: %s，但设备数据已更新到SQLite", e)
             
             return device
         finally:
-            db.close()
+            release_session()
     
     @staticmethod
     def delete_device(device_id: str) -> bool:
@@ -295,53 +307,35 @@ class DeviceService:
                 try:
                     tdengine_service.delete_device_table(device_id)
                 except Exception as e:
-                    print(f"TDengine表删除失败: {e}，但设备数据已从SQLite删除")
+                    logger.error("TDengine表删除失败: %s，但设备数据已从SQLite删除", e)
             
             # 清除仿真状态
             SimulationStateManager.clear_state(device_id)
             
             return True
         finally:
-            db.close()
+            release_session()
     
     @staticmethod
     def update_device_status(device_id: str, status: str) -> Optional[Device]:
         """更新设备状态"""
         db = DeviceService._get_db()
         try:
-            # 检查设备是否存在
-            existing_device = db.query(DeviceDB).filter(DeviceDB.id == device_id).first()
+            # 单条 UPDATE ... RETURNING：无需先 SELECT，返回行为空即设备不存在（updated_at 由 onupdate 更新）
+            stmt = update(DeviceDB).where(DeviceDB.id == device_id).values(status=status).returning(DeviceDB)
+            existing_device = db.execute(stmt).scalar_one_or_none()
             if not existing_device:
+                db.rollback()
                 return None
             
-            # 更新设备状态
-            existing_device.status = status
+            # Build the result before commit expires the row (same visual_model lookup as the read paths)
+            visual_model = db.query(CategoryDB.visual_model).filter(CategoryDB.code == existing_device.type).scalar()
+            updated = DeviceService._db_to_pydantic(existing_device, visual_model)
             db.commit()
-            db.refresh(existing_device)
             
-            # 将JSON字符串转换为参数列表
-            parameters = existing_device.parameters
-            if isinstance(parameters, str):
-                parameters = json.loads(parameters)
-            
-            return Device(
-                id=existing_device.id,
-                name=existing_device.name,
-                type=existing_device.type,
-                model=existing_device.model,
-                description=existing_device.description,
-                parameters=parameters,
-                sampling_rate=existing_device.sampling_rate,
-                status=existing_device.status,
-                physics_config=existing_device.physics_config if existing_device.physics_config else {},
-                logic_rules=existing_device.logic_rules if existing_device.logic_rules else [],
-                scenarios=existing_device.scenarios if existing_device.scenarios else ["Normal", "High Load", "Error State"],
-                scenario_configs=existing_device.scenario_configs if existing_device.scenario_configs else {},
-                created_at=existing_device.created_at,
-                updated_at=existing_device.updated_at
-            )
+            return updated
         finally:
-            db.close()
+            release_session()
 
 # 创建全局实例
 device_service = DeviceService()
@@ -0,0 +1,52 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from models.device import Parameter, TYPE_NUMBER, TYPE_BOOLEAN, TYPE_STRING
+
+try:
+    from asyncua import ua
+except ImportError:
+    ua = None
+
+# Modbus register encoding per parameter
+ENC_NUMBER, ENC_BOOL, ENC_SKIP = 0, 1, 2
+
+if ua is not None:
+    _OPCUA_VARIANTS = {
+        TYPE_NUMBER: ua.VariantType.Double,
+        TYPE_BOOLEAN: ua.VariantType.Boolean,
+        TYPE_STRING: ua.VariantType.String,
+    }
+
+@dataclass(frozen=True)
+class EncodedParamTable:
+    """
+    设备参数的协议编码表：首次见到设备（或参数列表变化）时构建一次，
+    Modbus / OPC UA 每tick直接读取预计算结果，不再逐参数判断类型
+    """
+    parameters: List[Parameter] # identity key: rebuilt when the device's parameter list changes
+    param_ids: Tuple[str, ...]
+    modbus_types: np.ndarray # int8 ENC_* per parameter
+    opcua_variants: Optional[Tuple["ua.VariantType", ...]] # None when asyncua is not installed
+
+# device_id -> EncodedParamTable (single dict assignment, safe across DataWriter worker threads)
+_tables: Dict[str, EncodedParamTable] = {}
+
+def get_param_table(device_id: str, parameters: List[Parameter]) -> EncodedParamTable:
+    """获取设备的参数编码表（参数列表对象变化时重建）"""
+    table = _tables.get(device_id)
+    if table is None or table.parameters is not parameters:
+        table = _tables[device_id] = _build_table(parameters)
+    return table
+
+def _build_table(parameters: List[Parameter]) -> EncodedParamTable:
+    types = [p.type for p in parameters]
+    return EncodedParamTable(
+        parameters=parameters,
+        param_ids=tuple(p.id for p in parameters),
+        modbus_types=np.fromiter(
+            (ENC_NUMBER if t == TYPE_NUMBER else ENC_BOOL if t == TYPE_BOOLEAN else ENC_SKIP for t in types),
+            dtype=np.int8, count=len(types)
+        ),
+        opcua_variants=tuple(_OPCUA_VARIANTS.get(t, ua.VariantType.Double) for t in types) if ua is not None else None,
+    )
@@ -1,7 +1,11 @@
+import array
+import asyncio
+import itertools
 import threading
 import time
-from typing import Dict, Any, List
-from pymodbus.server import StartTcpServer
+import numpy as np
+from typing import Dict, Any, List, NamedTuple, Tuple
+from pymodbus.server import ModbusTcpServer
 try:
     # Pymodbus 3.x
     from pymodbus.datastore import ModbusServerContext
@@ -20,8 +24,45 @@ except ImportError:
 
 from services.config_service import ConfigService
 from models.device import Parameter, ParameterType
+from services.protocols._encoders import ENC_BOOL, ENC_SKIP, get_param_table
 from utils.logger import logger
 
+# Every parameter is an IEEE-754 float32 in two big-endian holding registers (high word first)
+_REGISTERS_PER_PARAM = 2
+_REGISTERS_PER_DEVICE = 200 # 100 parameters per device
+_DATA_START = 100
+_REGISTER_COUNT = 65536 # Full 16-bit Modbus address space
+_FLOAT32_MAX = 3.4028234663852886e38
+
+class _DeviceEncoder(NamedTuple):
+    """Per-device register layout, built once per parameter list"""
+    parameters: List[Parameter] # identity key: rebuilt when the device's parameter list changes
+    start_register: int
+    param_ids: Tuple[str, ...] # exposed parameters, in register order
+    type_codes: np.ndarray # int8 ENC_* per exposed parameter (view of the shared EncodedParamTable)
+    value_ids: Tuple[str, ...] # ids of number/bool parameters (strings are never read)
+    value_slots: np.ndarray # positions of value_ids in the register layout
+    bool_slots: np.ndarray # positions of boolean parameters
+
+class _RegisterBlock(ModbusSequentialDataBlock):
+    """
+    Sequential block backed by array('H'): 2 bytes per register instead of a list slot per value.
+    Zero-initialised from a bytes buffer; reads return lists, as pymodbus expects.
+    """
+    def __init__(self, address: int, count: int):
+        super().__init__(address, [0])
+        self.values = array.array("H", bytes(2 * count))
+
+    def getValues(self, address, count=1):
+        start = address - self.address
+        return self.values[start:start + count].tolist()
+
+    def setValues(self, address, values):
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        start = address - self.address
+        self.values[start:start + len(values)] = array.array("H", values)
+
 class ModbusService:
     _instance = None
     
@@ -29,10 +70,15 @@ class ModbusService:
         if cls._instance is None:
             cls._instance = super(ModbusService, cls).__new__(cls)
             cls._instance.server_thread = None
+            cls._instance._server = None # ModbusTcpServer, created on the server thread's event loop
+            cls._instance._server_loop = None
             cls._instance.running = False
             cls._instance.context = None
             cls._instance.config = {}
-            cls._instance.device_mappings = {} # device_id -> register_offset
+            cls._instance.device_mappings = {} # device_id -> register_offset (copy-on-write, replaced atomically)
+            cls._instance._allocator = itertools.count(_DATA_START, _REGISTERS_PER_DEVICE)
+            # device_id -> _DeviceEncoder, rebuilt when the parameter list changes
+            cls._instance._encoders: Dict[str, _DeviceEncoder] = {}
             cls._instance._lock = threading.Lock()
         return cls._instance
 
@@ -58,12 +104,12 @@ class ModbusService:
             
             # Initialize Data Store
             # 0-99: System/Status
-            # 100+: Device Data
+            # 100+: Device Data (200 registers per device)
             store = ModbusSlaveContext(
-                di=ModbusSequentialDataBlock(0, [0]*10000),
-                co=ModbusSequentialDataBlock(0, [0]*10000),
-                hr=ModbusSequentialDataBlock(0, [0]*10000),
-                ir=ModbusSequentialDataBlock(0, [0]*10000)
+                di=_RegisterBlock(0, 10000),
+                co=_RegisterBlock(0, 10000),
+                hr=_RegisterBlock(0, _REGISTER_COUNT),
+                ir=_RegisterBlock(0, 10000)
             )
             self.context = ModbusServerContext(slaves=store, single=True)
             
@@ -75,68 +121,120 @@ class ModbusService:
             # identity.ModelName = 'Device Simulator Server'
             # identity.MajorMinorRevision = '1.0.0'
 
-            logger.info(f"Starting Modbus TCP Server on port {port}...")
+            logger.info("Starting Modbus TCP Server on port %s...", port)
             self.server_thread = threading.Thread(
-                target=StartTcpServer,
-                kwargs={"context": self.context, "address": ("0.0.0.0", port)}
+                target=asyncio.run,
+                args=(self._serve(self.context, port),)
             )
             self.server_thread.daemon = True
             self.server_thread.start()
             self.running = True
 
+    async def _serve(self, context, port: int):
+        """服务线程入口：在本线程事件循环中创建并运行 ModbusTcpServer（保留实例以便 stop() 关闭）"""
+        # pymodbus 3.x servers bind to the running loop, so the server is built here rather than in start()
+        server = ModbusTcpServer(context=context, address=("0.0.0.0", port))
+        self._server, self._server_loop = server, asyncio.get_running_loop()
+        if self.server_thread is not threading.current_thread():
+            return # stop() ran before the server was published
+        try:
+            await server.serve_forever()
+        except Exception as e:
+            logger.error("Modbus TCP Server on port %s failed: %s", port, e)
+        finally:
+            if self._server is server:
+                self._server = self._server_loop = None
+
     def stop(self):
-        """Stop Modbus Server (Not easily stoppable in pymodbus w/o server object access, but we can ignore updates)"""
-        # pymodbus StartTcpServer blocks, so we run it in a thread. 
-        # Stopping it gracefully requires accessing the server instance which StartTcpServer wraps.
-        # For now, we just set running=False to stop updating registers.
+        """Stop Modbus Server: close the listening socket and join the server thread"""
         self.running = False
-        logger.info("Modbus Service stopped (updates paused)")
+        server, loop, thread = self._server, self._server_loop, self.server_thread
+        self._server = self._server_loop = self.server_thread = None
+        if server is not None and loop is not None and loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(server.shutdown(), loop).result(timeout=2)
+            except Exception as e:
+                logger.error("Modbus TCP Server shutdown failed: %s", e)
+        if thread is not None:
+            thread.join(timeout=2)
+            if thread.is_alive():
+                logger.warning("Modbus server thread did not exit within 2s")
+        logger.info("Modbus Service stopped")
 
     def update(self, device_id: str, data: Dict[str, Any], parameters: List[Parameter]):
         """Update Modbus registers based on generated data"""
         if not self.running or not self.context:
             return
 
-        # Simple mapping strategy:
-        # We hash device_id to get a stable "slot" or just use a sequential allocator?
-        # For simplicity in this version: 
-        # We need a stable mapping. Let's assume we only simulate a few devices or 
-        # we map based on numeric ID if available. 
-        # Better approach: Store a mapping in memory.
-        
-        if device_id not in self.device_mappings:
-            # Allocate a new block of 100 registers per device
-            # Starting from 100
-            offset = 100 + len(self.device_mappings) * 100
-            self.device_mappings[device_id] = offset
-            
-        start_register = self.device_mappings[device_id]
+        encoder = self._encoders.get(device_id)
+        if encoder is None or encoder.parameters is not parameters:
+            encoder = self._build_encoder(device_id, parameters)
+        if not encoder.param_ids:
+            return
         
         slave_id = 0x00 # Unit ID
-        values = []
         
-        # Flatten parameters to registers
-        # Only support Numbers/Booleans
-        # 1 Register = 16 bits. 
-        # Floats need 2 registers (32 bits) usually, but let's scale to int for simplicity first or use ints
-        # For MVP: Round floats to integers
+        # Only support Numbers/Booleans (booleans as 1.0 / 0.0); strings stay 0.0
+        floats = np.zeros(len(encoder.param_ids), dtype=np.float64)
+        if encoder.value_ids:
+            raw = [data.get(pid) for pid in encoder.value_ids]
+            try:
+                values = np.array(raw, dtype=np.float64) # None -> nan
+            except (TypeError, ValueError):
+                # Value type differs from the declared parameter type (e.g. set by a logic rule)
+                values = np.array([self._encode_value(v) for v in raw], dtype=np.float64)
+            floats[encoder.value_slots] = values
+            np.nan_to_num(floats, copy=False, nan=0.0) # Missing values
+            floats[encoder.bool_slots] = floats[encoder.bool_slots] != 0
+            np.clip(floats, -_FLOAT32_MAX, _FLOAT32_MAX, out=floats)
         
-        for param in parameters:
-            val = data.get(param.id)
-            
-            if isinstance(val, (int, float)):
-                # Convert to 16-bit int (simple scaling or truncation)
-                # Handling floats properly in Modbus is complex (IEEE 754).
-                # Here we cast to int for simplicity.
-                int_val = int(val) & 0xFFFF 
-                values.append(int_val)
-            elif isinstance(val, bool):
-                values.append(1 if val else 0)
-            else:
-                values.append(0) # Skip strings
-                
-        if values:
-            register = 3 # Holding Registers
-            self.context[slave_id].setValues(register, start_register, values)
+        # Big-endian float32 viewed as big-endian 16-bit words: two registers per value, high word first
+        register = 3 # Holding Registers
+        self.context[slave_id].setValues(register, encoder.start_register, floats.astype(">f4").view(">u2").tolist())
+
+    def _build_encoder(self, device_id: str, parameters: List[Parameter]):
+        """为设备缓存寄存器起始地址与参数编码表中的类型编码"""
+        # Simple mapping strategy: sequential allocator, stable for the process lifetime
+        start_register = self.device_mappings.get(device_id)
+        if start_register is None:
+            # DataWriter updates devices from worker threads; only allocation takes the lock.
+            # Readers see either the old or the new mapping dict, never a partial update
+            with self._lock:
+                start_register = self.device_mappings.get(device_id)
+                if start_register is None:
+                    # Allocate a new block of 200 registers per device, starting from 100
+                    start_register = next(self._allocator)
+                    self.device_mappings = {**self.device_mappings, device_id: start_register}
+        
+        # Parameters beyond the device block / address space are not exposed
+        capacity = min(_REGISTERS_PER_DEVICE, _REGISTER_COUNT - start_register) // _REGISTERS_PER_PARAM
+        if len(parameters) > capacity:
+            logger.warning("Modbus: device %s exposes only the first %s of %s parameters", device_id, max(capacity, 0), len(parameters))
+        exposed = max(capacity, 0)
+        
+        table = get_param_table(device_id, parameters)
+        param_ids = table.param_ids[:exposed]
+        type_codes = table.modbus_types[:exposed]
+        value_slots = np.flatnonzero(type_codes != ENC_SKIP)
+        encoder = _DeviceEncoder(
+            parameters=parameters,
+            start_register=start_register,
+            param_ids=param_ids,
+            type_codes=type_codes,
+            value_ids=tuple(param_ids[i] for i in value_slots),
+            value_slots=value_slots,
+            bool_slots=np.flatnonzero(type_codes == ENC_BOOL),
+        )
+        self._encoders[device_id] = encoder
+        return encoder
+
+    @staticmethod
+    def _encode_value(val: Any) -> float:
+        """按值类型转换为浮点数（类型不匹配时的回退路径）"""
+        if isinstance(val, bool):
+            return 1.0 if val else 0.0
+        if isinstance(val, (int, float)):
+            return float(val)
+        return 0.0 # Skip strings
 
 modbus_service = ModbusService()
@@ -1,11 +1,20 @@
 import paho.mqtt.client as mqtt
 import json
+import os
 import threading
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from services.config_service import ConfigService
 from utils.logger import logger
 
+# orjson is optional: serializes straight to bytes, several times faster than json.dumps
+try:
+    import orjson
+    def _dumps(data: Dict[str, Any]) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC)
+except ImportError:
+    _dumps = json.dumps
+
 class MQTTService:
     _instance = None
     
@@ -16,6 +25,9 @@ class MQTTService:
             cls._instance.connected = False
             cls._instance.config = {}
             cls._instance._lock = threading.Lock()
+            # Topic template from settings, refreshed in start(); device_id -> resolved topic
+            cls._instance._topic_template = "devices/{device_id}/data"
+            cls._instance._topic_cache: Dict[str, str] = {}
         return cls._instance
 
     def start(self):
@@ -23,9 +35,15 @@ class MQTTService:
         with self._lock:
             settings = ConfigService.get_system_settings()
             
+            # start() is re-run on every settings update: refresh the publish-side cache first
+            topic_template = settings.get("mqtt_topic_template") or "devices/{device_id}/data"
+            if topic_template != self._topic_template:
+                self._topic_template = topic_template
+                self._topic_cache = {}
+            
             if not settings.get("mqtt_enabled", False):
-                if self.connected:
-                    self.stop()
+                if self.client:
+                    self._stop()
                 return
 
             # Check if config changed or not connected
@@ -36,67 +54,111 @@ class MQTTService:
                 "password": settings.get("mqtt_password"),
             }
             
-            if self.connected and self.config == new_config:
-                return # Already running with same config
-
-            if self.connected:
-                self.stop()
+            if self.client:
+                # Reuse the existing client (callbacks, queue limits, loop thread are kept)
+                if self.config == new_config:
+                    return # Already running with same config; paho reconnects on its own
+                needs_reconnect = (self.config.get("host"), self.config.get("port")) != (new_config["host"], new_config["port"])
+                self.config = new_config
+                self._apply_credentials()
+                if not needs_reconnect:
+                    return # Credentials apply on the next (re)connect
+                try:
+                    logger.info("Reconnecting MQTT client to %s:%s...", self.config['host'], self.config['port'])
+                    self.client.disconnect()
+                    self.client.loop_stop()
+                    self.client.connect(self.config["host"], int(self.config["port"]), 60)
+                    self.client.loop_start()
+                except Exception as e:
+                    logger.error("Failed to reconnect MQTT Service: %s", e)
+                    self._stop() # Next start() builds a fresh client
+                return
 
             self.config = new_config
             
             try:
-                self.client = mqtt.Client()
+                # Unique client id per process; clean session, plain TCP
+                self.client = mqtt.Client(client_id=f"DeviceSimulator-{os.getpid()}", clean_session=True, transport="tcp")
+                # Size paho's queues for bursts of small per-tick publishes
+                self.client.max_inflight_messages_set(100)
+                self.client.max_queued_messages_set(10000)
+                self.client.reconnect_delay_set(min_delay=1, max_delay=30)
                 
-                if self.config["user"] and self.config["password"]:
-                    self.client.username_pw_set(self.config["user"], self.config["password"])
+                self._apply_credentials()
                 
                 self.client.on_connect = self._on_connect
                 self.client.on_disconnect = self._on_disconnect
                 
-                logger.info(f"Connecting to MQTT Broker at {self.config['host']}:{self.config['port']}...")
+                logger.info("Connecting to MQTT Broker at %s:%s...", self.config['host'], self.config['port'])
                 self.client.connect(self.config["host"], int(self.config["port"]), 60)
                 self.client.loop_start()
                 
             except Exception as e:
-                logger.error(f"Failed to start MQTT Service: {e}")
+                logger.error("Failed to start MQTT Service: %s", e)
                 self.client = None
                 self.connected = False
 
+    def _apply_credentials(self):
+        if self.config["user"] and self.config["password"]:
+            self.client.username_pw_set(self.config["user"], self.config["password"])
+        else:
+            self.client.username_pw_set(None, None)
+
     def stop(self):
         """Stop MQTT Client"""
         with self._lock:
-            if self.client:
-                self.client.loop_stop()
-                self.client.disconnect()
-                self.client = None
-            self.connected = False
-            logger.info("MQTT Service stopped")
+            self._stop()
+
+    def _stop(self):
+        """Stop MQTT Client (caller holds self._lock)"""
+        if self.client:
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.client = None
+        self.connected = False
+        logger.info("MQTT Service stopped")
 
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             logger.info("Connected to MQTT Broker!")
             self.connected = True
         else:
-            logger.error(f"Failed to connect to MQTT Broker, return code {rc}")
+            logger.error("Failed to connect to MQTT Broker, return code %s", rc)
             self.connected = False
 
     def _on_disconnect(self, client, userdata, rc):
         logger.info("Disconnected from MQTT Broker")
         self.connected = False
 
+    def _topic(self, device_id: str) -> str:
+        """Resolved topic for a device (cached until the template changes)"""
+        topic = self._topic_cache.get(device_id)
+        if topic is None:
+            topic = self._topic_cache[device_id] = self._topic_template.replace("{device_id}", device_id)
+        return topic
+
     def publish(self, device_id: str, data: Dict[str, Any]):
         """Publish data to MQTT"""
         if not self.connected or not self.client:
             return
 
-        settings = ConfigService.get_system_settings()
-        topic_template = settings.get("mqtt_topic_template", "devices/{device_id}/data")
-        topic = topic_template.replace("{device_id}", device_id)
+        topic = self._topic(device_id)
         
         try:
-            payload = json.dumps(data)
+            payload = _dumps(data)
             self.client.publish(topic, payload)
         except Exception as e:
-            logger.error(f"MQTT Publish failed: {e}")
+            logger.error("MQTT Publish failed: %s", e)
+
+    def publish_many(self, messages: List[Tuple[str, Dict[str, Any]]]):
+        """Publish one tick of device data (topics come from the per-device cache)"""
+        if not self.connected or not self.client or not messages:
+            return
+
+        for device_id, data in messages:
+            try:
+                self.client.publish(self._topic(device_id), _dumps(data))
+            except Exception as e:
+                logger.error("MQTT Publish failed: %s", e)
 
 mqtt_service = MQTTService()
@@ -3,6 +3,7 @@ import asyncio
 import threading
 from typing import Dict, Any
 from services.config_service import ConfigService
+from services.protocols._encoders import get_param_table
 from utils.logger import logger
 
 # Try to import asyncua, handle failure gracefully
@@ -11,7 +12,15 @@ try:
     ASYNCUA_AVAILABLE = True
 except ImportError as e:
     ASYNCUA_AVAILABLE = False
-    logger.warning(f"Warning: asyncua import failed: {e}. OPC UA service will be disabled.")
+    logger.warning("Warning: asyncua import failed: %s. OPC UA service will be disabled.", e)
+
+if ASYNCUA_AVAILABLE:
+    # VariantType -> initial value of a new variable
+    _INITIAL_VALUES = {
+        ua.VariantType.Double: 0.0,
+        ua.VariantType.Boolean: False,
+        ua.VariantType.String: "",
+    }
 
 class OPCUAService:
     def __init__(self):
@@ -19,7 +28,9 @@ class OPCUAService:
         self.running = False
         self.loop = None
         self.thread = None
-        self.nodes = {} # device_id -> { 'object': obj_node, 'vars': { param_name: var_node } }
+        # device_id -> { 'object': obj_node, 'vars': { param_id: (var_node, variant_type) },
+        #                'vars_list': [(param_id, var_node, variant_type), ...] in parameter order }
+        self.nodes = {}
         self.idx = 0
         
     def start(self):
@@ -80,7 +91,7 @@ class OPCUAService:
         
         # Start
         async with self.server:
-            logger.info(f"OPC UA Server started at {self.server.endpoint}")
+            logger.info("OPC UA Server started at %s", self.server.endpoint)
             while self.running:
                 await asyncio.sleep(1)
 
@@ -106,17 +117,22 @@ class OPCUAService:
         if not node_info:
             return
 
-        # Update variables
-        for key, value in data.items():
-            if key in node_info['vars']:
-                var_node = node_info['vars'][key]
-                # Determine variant type based on value?
-                # For now, just write value. Asyncua handles type inference usually.
-                try:
-                    # ua.VariantType...
-                    await var_node.write_value(value)
-                except Exception as e:
-                    logger.error(f"OPC UA write error for {device_id}.{key}: {e}")
+        # Update variables: variant types were fixed at node creation (no per-write inference);
+        # all writes of this device go to the address space directly and are awaited together
+        keys = []
+        writes = []
+        for key, var_node, variant_type in node_info['vars_list']:
+            value = data.get(key)
+            # Missing samples (None) keep the last value; typed variables refuse Null writes
+            if value is None:
+                continue
+            keys.append(key)
+            writes.append(self.server.write_attribute_value(var_node.nodeid, ua.DataValue(ua.Variant(value, variant_type))))
+        
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                logger.error("OPC UA write error for %s.%s: %s", device_id, key, result)
 
     async def _create_device_node(self, device_id: str, parameters: list):
         """Create Object Node for device"""
@@ -128,24 +144,24 @@ class OPCUAService:
             
             self.nodes[device_id] = {
                 'object': dev_obj,
-                'vars': {}
+                'vars': {},
+                'vars_list': []
             }
             
             # Create Variables
             if parameters:
-                for param in parameters:
-                    p_name = param.name # Or id?
-                    p_id = param.id if hasattr(param, 'id') else param.get('id')
-                    
-                    # Default value
-                    init_val = 0.0
+                # Variant types come from the shared per-device encoding table
+                table = get_param_table(device_id, parameters)
+                for p_id, variant_type in zip(table.param_ids, table.opcua_variants):
+                    init_val = _INITIAL_VALUES[variant_type]
                     
-                    var_node = await dev_obj.add_variable(self.idx, p_id, init_val)
+                    var_node = await dev_obj.add_variable(self.idx, p_id, init_val, varianttype=variant_type)
                     await var_node.set_writable() # Set client writable?
-                    self.nodes[device_id]['vars'][p_id] = var_node
+                    self.nodes[device_id]['vars'][p_id] = (var_node, variant_type)
+                    self.nodes[device_id]['vars_list'].append((p_id, var_node, variant_type))
                     
         except Exception as e:
-            logger.error(f"Error creating OPC UA node for {device_id}: {e}")
+            logger.error("Error creating OPC UA node for %s: %s", device_id, e)
 
 # Global instance
 opcua_service = OPCUAService()
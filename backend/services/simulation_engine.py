@@ -1,33 +1,66 @@
-import random
 import math
+import sys
 import time
-from typing import Any, Dict, List, Optional
-from models.device import Parameter, ParameterType, GenerationMode
+import functools
+from collections import ChainMap
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional, Union
+
+# Numba is optional: without it the NumPy implementations below are used
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+# The on-disk kernel cache needs the .py source next to it, which a PyInstaller build doesn't ship
+# (cache=True then raises "no locator available" at import): compile without caching when frozen
+_NUMBA_CACHE = not getattr(sys, "frozen", False)
+from models.device import (
+    Parameter, GenerationMode, TYPE_NUMBER, TYPE_BOOLEAN, TYPE_STRING,
+    MODE_RANDOM, MODE_LINEAR, MODE_PERIODIC, MODE_RANDOM_WALK,
+    CompiledErrorConfig, ERR_MCAR, ERR_DRIFT, ERR_DRIFT_RESET, ERR_ANOMALY, ERR_NOISE
+)
+from utils.logger import logger
 
 # --- 1. Simulation Strategy (Generator) ---
 class SimulationStrategy:
     """
     Base class for data generation strategies.
+    rng: the owning device's np.random.Generator (per-thread default if not given).
     """
-    def generate(self, parameter: Parameter, params: Dict[str, Any]) -> Any:
+    def generate(self, parameter: Parameter, params: Dict[str, Any], rng: np.random.Generator = None) -> Any:
         raise NotImplementedError
 
+# Fallback generator for stateless calls (no DeviceState): one PCG64 stream per thread,
+# since a Generator must not be shared across DataWriter workers
+_tls = threading.local()
+
+def _rng() -> np.random.Generator:
+    rng = getattr(_tls, "rng", None)
+    if rng is None:
+        rng = _tls.rng = np.random.default_rng()
+    return rng
+
+# Alphabet for random strings as a byte table: one fancy-index + decode per string
+_RANDOM_CHARS = np.frombuffer(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", dtype=np.uint8)
+
 class RandomStrategy(SimulationStrategy):
-    def generate(self, parameter: Parameter, params: Dict[str, Any]) -> Any:
-        if parameter.type == ParameterType.NUMBER:
+    def generate(self, parameter: Parameter, params: Dict[str, Any], rng: np.random.Generator = None) -> Any:
+        rng = rng or _rng()
+        if parameter.type == TYPE_NUMBER:
             min_val = parameter.min_value if parameter.min_value is not None else 0
             max_val = parameter.max_value if parameter.max_value is not None else 100
-            return random.uniform(min_val, max_val)
-        elif parameter.type == ParameterType.BOOLEAN:
-            return random.choice([True, False])
-        elif parameter.type == ParameterType.STRING:
+            return float(rng.uniform(min_val, max_val))
+        elif parameter.type == TYPE_BOOLEAN:
+            return bool(rng.random() < 0.5)
+        elif parameter.type == TYPE_STRING:
             length = params.get("length", 10)
-            chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-            return ''.join(random.choice(chars) for _ in range(length))
+            return _RANDOM_CHARS[rng.integers(0, len(_RANDOM_CHARS), size=length)].tobytes().decode("ascii")
         return None
 
 class LinearStrategy(SimulationStrategy):
-    def generate(self, parameter: Parameter, params: Dict[str, Any]) -> Any:
+    def generate(self, parameter: Parameter, params: Dict[str, Any], rng: np.random.Generator = None) -> Any:
         if "current_value" not in params:
             params["current_value"] = parameter.default_value if parameter.default_value is not None else (parameter.min_value or 0)
         
@@ -45,24 +78,33 @@ class LinearStrategy(SimulationStrategy):
         params["current_value"] = new_value
         return new_value
 
+# Sine lookup table over one full turn; phase advances by a fixed step per tick,
+# so a table load replaces the sin() call (max abs error ~1.5e-3)
+_SIN_TABLE_SIZE = 4096
+_SIN_TABLE_MASK = _SIN_TABLE_SIZE - 1
+_SIN_TABLE = np.sin(2 * np.pi * np.arange(_SIN_TABLE_SIZE) / _SIN_TABLE_SIZE)
+_SIN_TABLE_LIST = _SIN_TABLE.tolist()
+
 class PeriodicStrategy(SimulationStrategy):
-    def generate(self, parameter: Parameter, params: Dict[str, Any]) -> Any:
+    def generate(self, parameter: Parameter, params: Dict[str, Any], rng: np.random.Generator = None) -> Any:
         if "time" not in params:
             params["time"] = 0
         
-        period = params.get("period", 100)
-        min_val = parameter.min_value if parameter.min_value is not None else 0
-        max_val = parameter.max_value if parameter.max_value is not None else 100
-        
-        amplitude = params.get("amplitude", (max_val - min_val) / 2)
-        offset = params.get("offset", (min_val + max_val) / 2)
+        if "_sin_scale" not in params:
+            period = params.get("period", 100)
+            min_val = parameter.min_value if parameter.min_value is not None else 0
+            max_val = parameter.max_value if parameter.max_value is not None else 100
+            params["_sin_scale"] = _SIN_TABLE_SIZE / period
+            params["_amplitude"] = params.get("amplitude", (max_val - min_val) / 2)
+            params["_offset"] = params.get("offset", (min_val + max_val) / 2)
         
-        value = offset + amplitude * math.sin(2 * math.pi * params["time"] / period)
+        idx = int(params["time"] * params["_sin_scale"]) & _SIN_TABLE_MASK
+        value = params["_offset"] + params["_amplitude"] * _SIN_TABLE_LIST[idx]
         params["time"] += 1
         return value
 
 class RandomWalkStrategy(SimulationStrategy):
-    def generate(self, parameter: Parameter, params: Dict[str, Any]) -> Any:
+    def generate(self, parameter: Parameter, params: Dict[str, Any], rng: np.random.Generator = None) -> Any:
         if "current_value" not in params:
             params["current_value"] = parameter.default_value if parameter.default_value is not None else (parameter.min_value or 0)
         
@@ -72,14 +114,11 @@ class RandomWalkStrategy(SimulationStrategy):
             max_val = parameter.max_value if parameter.max_value is not None else 100
             step_range = (max_val - min_val) * 0.01 if max_val != min_val else 1.0
             
-        change = random.uniform(-step_range, step_range)
-        new_value = params["current_value"] + change
+        change = float((rng or _rng()).uniform(-step_range, step_range))
+        # Unbounded sides clamp against +/-inf, so both bounds are applied unconditionally
+        new_value = min(max(params["current_value"] + change, _or_default(parameter.min_value, -math.inf)),
+                        _or_default(parameter.max_value, math.inf))
         
-        if parameter.min_value is not None:
-            new_value = max(parameter.min_value, new_value)
-        if parameter.max_value is not None:
-            new_value = min(parameter.max_value, new_value)
-            
         params["current_value"] = new_value
         return new_value
 
@@ -89,48 +128,52 @@ class ErrorInjector:
     Handles advanced error simulation: Anomaly, Drift, MCAR, Duplicate.
     """
     @staticmethod
-    def apply(value: Any, error_config: Dict[str, Any], context: Dict[str, Any]) -> Any:
+    def apply(value: Any, error_config: Union[CompiledErrorConfig, Dict[str, Any]], context: Dict[str, Any],
+              rng: np.random.Generator = None, draws: Optional[tuple] = None, now: Optional[float] = None) -> Any:
+        """
+        error_config: Parameter.compiled_error_config (a raw dict is compiled on each call)
+        draws: optional pre-drawn (mcar_hit, anomaly_hit, noise) for this parameter (scalar path; see ParameterBatch.apply_errors for the batched one)
+        now: the tick's time.monotonic() (read here once if not given)
+        """
         if value is None:
             return None
+        
+        cfg = error_config if isinstance(error_config, CompiledErrorConfig) else CompiledErrorConfig.from_dict(error_config)
+        flags = cfg.flags
+        rng = rng or _rng()
             
         # MCAR (Missing Completely At Random)
-        if "mcar_probability" in error_config:
-            if random.random() < error_config["mcar_probability"]:
+        if flags & ERR_MCAR:
+            if draws[0] if draws else rng.random() < cfg.mcar_probability:
                 return None
 
         # Only apply numerical errors to numbers
         if isinstance(value, (int, float)):
             # Drift
-            if "drift_rate" in error_config:
+            if flags & ERR_DRIFT:
                 # Drift accumulates over time
-                if "drift_accumulated" not in context:
-                    context["drift_accumulated"] = 0.0
-                
-                drift_rate = error_config["drift_rate"] # units per second (approx per tick)
-                context["drift_accumulated"] += drift_rate
+                drift = context.get("drift_accumulated", 0.0) + cfg.drift_rate # units per second (approx per tick)
                 
                 # Optional reset
-                if "drift_reset_interval" in error_config:
-                    if "drift_start_time" not in context:
-                        context["drift_start_time"] = time.time()
-                    if time.time() - context["drift_start_time"] > error_config["drift_reset_interval"]:
-                        context["drift_accumulated"] = 0.0
-                        context["drift_start_time"] = time.time()
-                        
-                value += context["drift_accumulated"]
+                if flags & ERR_DRIFT_RESET:
+                    if now is None:
+                        now = time.monotonic()
+                    start = context.setdefault("drift_start_time", now)
+                    if now - start > cfg.drift_reset_interval:
+                        drift = 0.0
+                        context["drift_start_time"] = now
+                
+                context["drift_accumulated"] = drift
+                value += drift
 
             # Anomaly (Spike)
-            if "anomaly_probability" in error_config:
-                if random.random() < error_config["anomaly_probability"]:
-                    multiplier = error_config.get("anomaly_multiplier", 1.5)
-                    value *= multiplier
+            if flags & ERR_ANOMALY:
+                if draws[1] if draws else rng.random() < cfg.anomaly_probability:
+                    value *= cfg.anomaly_multiplier
             
             # Noise (Gaussian)
-            if "noise_std_dev" in error_config:
-                std_dev = error_config["noise_std_dev"]
-                if std_dev > 0:
-                    noise = random.gauss(0, std_dev)
-                    value += noise
+            if flags & ERR_NOISE:
+                value += draws[2] if draws else float(rng.normal(0, cfg.noise_std_dev))
 
         return value
 
@@ -146,116 +189,502 @@ class PhysicsEngine:
         state: {'position': 0, 'velocity': 0}
         physics_config: {'mass': 10, 'max_velocity': 5, 'acceleration': 1, 'target_position': 100}
         """
-        pos = state.get("position", 0.0)
-        vel = state.get("velocity", 0.0)
-        
-        acc = physics_config.get("acceleration", 0.0)
-        max_vel = physics_config.get("max_velocity", float('inf'))
-        
-        # Simple logic: accelerate towards target if defined, else just drift
         target = physics_config.get("target_position")
-        if target is not None:
-            if pos < target:
-                vel += acc * dt
-            elif pos > target:
-                vel -= acc * dt
-        
-        # Clamp velocity
-        vel = max(-max_vel, min(max_vel, vel))
-        
-        # Update position
-        pos += vel * dt
-        
-        state["position"] = pos
-        state["velocity"] = vel
+        state["position"], state["velocity"] = _physics_step(
+            float(state.get("position", 0.0)),
+            float(state.get("velocity", 0.0)),
+            float(physics_config.get("acceleration", 0.0)),
+            float(physics_config.get("max_velocity", math.inf)),
+            float(target) if target is not None else 0.0,
+            target is not None,
+            float(dt)
+        )
         return state
 
-from simpleeval import simple_eval
+def _physics_step_py(pos, vel, acc, max_vel, target, has_target, dt):
+    """One kinematics step on plain floats -> (position, velocity)"""
+    # Simple logic: accelerate towards target if defined, else just drift
+    if has_target:
+        if pos < target:
+            vel += acc * dt
+        elif pos > target:
+            vel -= acc * dt
+    
+    # Clamp velocity
+    vel = max(-max_vel, min(max_vel, vel))
+    
+    # Update position
+    return pos + vel * dt, vel
+
+if NUMBA_AVAILABLE:
+    # Explicit signature: compiled (or loaded from cache) at import, not on the first tick.
+    # No fastmath: max_velocity defaults to +inf
+    _physics_step = njit("UniTuple(f8, 2)(f8, f8, f8, f8, f8, b1, f8)", cache=_NUMBA_CACHE)(_physics_step_py)
+else:
+    _physics_step = _physics_step_py
+
+from simpleeval import SimpleEval, DEFAULT_FUNCTIONS
+
+# evalidate is optional: whitelisted expressions run as CPython bytecode instead of simpleeval's AST walker
+try:
+    from evalidate import Expr, EvalModel, base_eval_model
+    EVALIDATE_AVAILABLE = True
+except ImportError:
+    EVALIDATE_AVAILABLE = False
 
 # --- 4. Logic Engine ---
+_LOGIC_NAMES = {"math": math, "max": max, "min": min, "abs": abs}
+
+# Rule-level rand()/randint(top) draw from the per-thread PCG64 stream instead of the stdlib
+# Mersenne Twister (module-global state shared by every DataWriter worker)
+def _rule_rand() -> float:
+    return float(_rng().random())
+
+def _rule_randint(top) -> int:
+    return int(_rng().random() * top) # [0, top), like simpleeval's randint
+
+_SIMPLEEVAL_FUNCTIONS = {**DEFAULT_FUNCTIONS, "rand": _rule_rand, "randint": _rule_randint}
+
+if EVALIDATE_AVAILABLE:
+    # Callable functions: simpleeval's defaults plus the helpers exposed in _LOGIC_NAMES.
+    # No '**' (unbounded in CPython, capped by simpleeval): such rules stay on simpleeval
+    _RULE_FUNCTIONS = {**_SIMPLEEVAL_FUNCTIONS, "max": max, "min": min, "abs": abs}
+    _RULE_MODEL = EvalModel(
+        nodes=base_eval_model.nodes + ["Mult", "FloorDiv", "UAdd", "Call"],
+        allowed_functions=list(_RULE_FUNCTIONS),
+    )
+    # Restricted builtins for eval(); rule values are passed as locals
+    _RULE_GLOBALS = {"__builtins__": _RULE_FUNCTIONS}
+
+def _evaluator() -> SimpleEval:
+    # SimpleEval keeps its names on the instance: one evaluator per DataWriter thread
+    evaluator = getattr(_tls, "evaluator", None)
+    if evaluator is None:
+        evaluator = _tls.evaluator = SimpleEval(functions=_SIMPLEEVAL_FUNCTIONS.copy())
+    return evaluator
+
+def _compile_expression(expr: str):
+    """
+    编译规则表达式为 fn(names) -> value：
+    优先使用 evalidate 校验后的字节码，否则（未安装或表达式超出白名单）使用预解析的 simpleeval AST
+    """
+    if EVALIDATE_AVAILABLE:
+        try:
+            code = Expr(expr, model=_RULE_MODEL).code
+            return lambda names: eval(code, _RULE_GLOBALS, names)
+        except Exception:
+            pass # Not in the whitelist: simpleeval decides (and reports) below
+    node = SimpleEval.parse(expr)
+    def evaluate(names):
+        evaluator = _evaluator()
+        evaluator.names = names
+        return evaluator.eval(expr, previously_parsed=node)
+    return evaluate
+
 class LogicEngine:
     """
     Evaluates user-defined rules.
+    Conditions and action values are compiled once per rule list; ticks only run the cached code.
     """
-    @staticmethod
-    def evaluate(context: Dict[str, Any], rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def __init__(self, rules: List[Dict[str, Any]]):
         """
-        context: Dictionary of current parameter values.
         rules: List of dicts like {'condition': 'temp > 100', 'action': 'status = "alarm"'}
         """
-        updates = {}
-        
-        # Safe evaluation environment
-        safe_dict = context.copy()
-        safe_dict.update({"math": math, "max": max, "min": min, "abs": abs})
-        
+        # [(condition_fn, key, value_fn)]
+        self.compiled = []
         for rule in rules:
             condition = rule.get("condition")
             action = rule.get("action")
             
-            if not condition or not action:
+            # Action is expected to be assignment-like, e.g., "status = 'alarm'"
+            # We'll parse it simply: key = value
+            if not condition or not action or "=" not in action:
                 continue
-                
+            key, val_expr = action.split("=", 1)
+            key = key.strip()
+            val_expr = val_expr.strip()
+            
             try:
-                # Evaluate condition using simpleeval
-                if simple_eval(condition, names=safe_dict):
-                    # Execute action
-                    # Action is expected to be assignment-like, e.g., "status = 'alarm'"
-                    # We'll parse it simply: key = value
-                    if "=" in action:
-                        key, val_expr = action.split("=", 1)
-                        key = key.strip()
-                        val_expr = val_expr.strip()
-                        
-                        val = simple_eval(val_expr, names=safe_dict)
-                        updates[key] = val
-                        safe_dict[key] = val # Update context for subsequent rules
+                self.compiled.append((_compile_expression(condition), key, _compile_expression(val_expr)))
             except Exception as e:
-                print(f"Logic evaluation error: {e}")
+                logger.error("Logic rule parse error: %s", e)
+
+    def run(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        context: Dictionary of current parameter values.
+        """
+        updates = {}
+        if not self.compiled:
+            return updates
+        
+        # Safe evaluation environment, without copying the context: rule assignments land in the
+        # front dict (context is not mutated); helper names shadow parameters, as before
+        safe_dict = ChainMap({}, _LOGIC_NAMES, context)
+        
+        for condition_fn, key, value_fn in self.compiled:
+            try:
+                # Evaluate condition, then the action value, from the compiled expressions
+                if condition_fn(safe_dict):
+                    val = value_fn(safe_dict)
+                    updates[key] = val
+                    safe_dict[key] = val # Update context for subsequent rules
+            except Exception as e:
+                logger.error("Logic evaluation error: %s", e)
                 
         return updates
 
+    @staticmethod
+    def evaluate(context: Dict[str, Any], rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        context: Dictionary of current parameter values.
+        rules: List of dicts like {'condition': 'temp > 100', 'action': 'status = "alarm"'}
+        """
+        return LogicEngine.compile(rules).run(context)
+
+    @staticmethod
+    def compile(rules: List[Dict[str, Any]]) -> "LogicEngine":
+        """按规则文本缓存编译结果（设备缓存刷新会生成新的规则列表对象，故不按 id 缓存）"""
+        return _compile_rules(tuple((rule.get("condition"), rule.get("action")) for rule in rules))
+
+@functools.lru_cache(maxsize=1024)
+def _compile_rules(rules) -> LogicEngine:
+    return LogicEngine([{"condition": condition, "action": action} for condition, action in rules])
+
 # --- Factory ---
 class StrategyFactory:
+    # Keyed by plain str value: Parameter stores enum values (use_enum_values),
+    # and a str Enum member does not hash like its value.
     _strategies = {
-        GenerationMode.RANDOM: RandomStrategy(),
-        GenerationMode.LINEAR: LinearStrategy(),
-        GenerationMode.PERIODIC: PeriodicStrategy(),
-        GenerationMode.RANDOM_WALK: RandomWalkStrategy(),
+        GenerationMode.RANDOM.value: RandomStrategy(),
+        GenerationMode.LINEAR.value: LinearStrategy(),
+        GenerationMode.PERIODIC.value: PeriodicStrategy(),
+        GenerationMode.RANDOM_WALK.value: RandomWalkStrategy(),
     }
     
     @staticmethod
+    @functools.cache
     def get_strategy(mode: GenerationMode) -> SimulationStrategy:
-        return StrategyFactory._strategies.get(mode, RandomStrategy())
+        if isinstance(mode, GenerationMode):
+            mode = mode.value
+        # Unknown modes fall back to the shared RANDOM singleton (no per-mode instance)
+        return StrategyFactory._strategies.get(mode) or StrategyFactory._strategies[GenerationMode.RANDOM.value]
 
     @staticmethod
-    def generate_next_value(parameter: Parameter, params: Dict[str, Any]) -> Any:
+    def generate_next_value(parameter: Parameter, params: Dict[str, Any], rng: np.random.Generator = None) -> Any:
         strategy = StrategyFactory.get_strategy(parameter.generation_mode)
-        value = strategy.generate(parameter, params)
+        value = strategy.generate(parameter, params, rng)
         
         # Enforce integer type if configured
-        if parameter.type == ParameterType.NUMBER and getattr(parameter, "is_integer", False) and isinstance(value, (int, float)):
+        if parameter.type == TYPE_NUMBER and getattr(parameter, "is_integer", False) and isinstance(value, (int, float)):
             value = round(value)
             
         return value
 
-# --- 5. State Management ---
+# --- 5. Vectorized Batch ---
+class ParameterBatch:
+    """
+    Structure-of-arrays view of a device's numeric RANDOM / LINEAR / PERIODIC / RANDOM_WALK
+    and boolean RANDOM parameters.
+    Built once per parameter list and reused across ticks; linear/walk values, linear direction and
+    periodic phase are carried over from the previous batch (or the scalar parameter state) on rebuild.
+    Every other parameter is left to the scalar strategy path.
+    """
+    def __init__(self, parameters: List[Parameter], previous: Optional["ParameterBatch"] = None,
+                 parameter_states: Optional[Dict[str, Dict[str, Any]]] = None,
+                 error_context: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.parameters = parameters
+        # Key set of the per-tick value dict, so it can be allocated at its final size
+        self.param_names = tuple(p.name for p in parameters)
+        carried = previous.carried_state() if previous else {}
+        parameter_states = parameter_states or {}
+        error_context = error_context or {}
+        
+        random_params, linear_params, periodic_params, walk_params = [], [], [], []
+        bool_params = []
+        self.scalar_params: List[Parameter] = []
+        for param in parameters:
+            if param.type == TYPE_BOOLEAN and param.generation_mode == MODE_RANDOM:
+                bool_params.append(param)
+                continue
+            if param.type == TYPE_NUMBER:
+                if param.generation_mode == MODE_RANDOM:
+                    random_params.append(param)
+                    continue
+                if param.generation_mode == MODE_LINEAR:
+                    linear_params.append(param)
+                    continue
+                if param.generation_mode == MODE_PERIODIC:
+                    periodic_params.append(param)
+                    continue
+                if param.generation_mode == MODE_RANDOM_WALK:
+                    walk_params.append(param)
+                    continue
+            self.scalar_params.append(param)
+        # Strategy resolved once per batch instead of per parameter per tick
+        self.scalar_strategies = [StrategyFactory.get_strategy(p.generation_mode) for p in self.scalar_params]
+        
+        # RANDOM: uniform(min, max)
+        self.random_names = [p.name for p in random_params]
+        self.random_lows = np.array([_or_default(p.min_value, 0) for p in random_params], dtype=np.float64)
+        self.random_highs = np.array([_or_default(p.max_value, 100) for p in random_params], dtype=np.float64)
+        
+        # Boolean RANDOM: fair coin per parameter
+        self.bool_names = [p.name for p in bool_params]
+        
+        # LINEAR: current + step, step reversed when leaving [min, max] (only if both bounds are set)
+        self.linear_ids = [p.id for p in linear_params]
+        self.linear_names = [p.name for p in linear_params]
+        values, steps = [], []
+        for p in linear_params:
+            state = carried.get(p.id) or parameter_states.get(p.id) or p.generation_params or {}
+            start = p.default_value if p.default_value is not None else (p.min_value or 0)
+            values.append(state.get("current_value", start))
+            steps.append(state.get("step", 1))
+        self.linear_values = np.array(values, dtype=np.float64)
+        self.linear_steps = np.array(steps, dtype=np.float64)
+        # Integer start and step stay integers (as current + step does in LinearStrategy): slots converted back from float64
+        self.linear_int_slots = [i for i, (v, s) in enumerate(zip(values, steps)) if isinstance(v, int) and isinstance(s, int)]
+        bounded = [p.min_value is not None and p.max_value is not None for p in linear_params]
+        self.linear_mins = np.array([p.min_value if b else -np.inf for p, b in zip(linear_params, bounded)], dtype=np.float64)
+        self.linear_maxs = np.array([p.max_value if b else np.inf for p, b in zip(linear_params, bounded)], dtype=np.float64)
+        
+        # PERIODIC: offset + amplitude * sin(2*pi*t / period), via the sine table
+        self.periodic_ids = [p.id for p in periodic_params]
+        self.periodic_names = [p.name for p in periodic_params]
+        periods, amplitudes, offsets, times = [], [], [], []
+        for p in periodic_params:
+            gp = p.generation_params or {}
+            min_val = _or_default(p.min_value, 0)
+            max_val = _or_default(p.max_value, 100)
+            periods.append(gp.get("period", 100))
+            amplitudes.append(gp.get("amplitude", (max_val - min_val) / 2))
+            offsets.append(gp.get("offset", (min_val + max_val) / 2))
+            state = carried.get(p.id) or parameter_states.get(p.id) or gp
+            times.append(state.get("time", 0))
+        # Phase is kept in sine-table index units and advanced by a per-parameter increment each tick
+        self.periodic_scales = _SIN_TABLE_SIZE / np.array(periods, dtype=np.float64)
+        self.periodic_amplitudes = np.array(amplitudes, dtype=np.float64)
+        self.periodic_offsets = np.array(offsets, dtype=np.float64)
+        self.periodic_phases = np.fmod(np.array(times, dtype=np.float64) * self.periodic_scales, _SIN_TABLE_SIZE)
+        
+        # RANDOM_WALK: current + uniform(-step, step), clamped to [min, max]
+        self.walk_ids = [p.id for p in walk_params]
+        self.walk_names = [p.name for p in walk_params]
+        values, steps = [], []
+        for p in walk_params:
+            gp = p.generation_params or {}
+            start = gp.get("current_value", p.default_value if p.default_value is not None else (p.min_value or 0))
+            state = carried.get(p.id) or parameter_states.get(p.id) or gp
+            values.append(state.get("current_value", start))
+            step_range = gp.get("step_range")
+            if step_range is None:
+                min_val = _or_default(p.min_value, 0)
+                max_val = _or_default(p.max_value, 100)
+                step_range = (max_val - min_val) * 0.01 if max_val != min_val else 1.0
+            steps.append(step_range)
+        self.walk_values = np.array(values, dtype=np.float64)
+        self.walk_steps = np.array(steps, dtype=np.float64)
+        self.walk_mins = np.array([_or_default(p.min_value, -np.inf) for p in walk_params], dtype=np.float64)
+        self.walk_maxs = np.array([_or_default(p.max_value, np.inf) for p in walk_params], dtype=np.float64)
+        
+        # Error injection: one slot per parameter with an error_config (in parameter order).
+        # Absent settings are neutral (rate 0, multiplier 1, std 0); drift state is seeded from error_context
+        error_params = [p for p in parameters if p.error_config]
+        configs = [p.compiled_error_config for p in error_params]
+        self.error_count = len(error_params)
+        self.error_ids = [p.id for p in error_params]
+        self.error_names = [p.name for p in error_params]
+        self.error_mcar_rates = np.array([c.mcar_probability for c in configs], dtype=np.float64)
+        self.error_anomaly_rates = np.array([c.anomaly_probability for c in configs], dtype=np.float64)
+        self.error_anomaly_mults = np.array([c.anomaly_multiplier for c in configs], dtype=np.float64)
+        self.error_noise_stds = np.array([c.noise_std_dev for c in configs], dtype=np.float64)
+        self.error_has_drift = np.array([bool(c.flags & ERR_DRIFT) for c in configs], dtype=bool)
+        self.error_drift_rates = np.array([c.drift_rate for c in configs], dtype=np.float64)
+        # Without ERR_DRIFT_RESET the interval is +inf, so the reset test never fires
+        self.error_reset_intervals = np.array([c.drift_reset_interval for c in configs], dtype=np.float64)
+        contexts = [error_context.get(pid) or {} for pid in self.error_ids]
+        self.error_drift = np.array([c.get("drift_accumulated", 0.0) for c in contexts], dtype=np.float64)
+        self.error_drift_start = np.array([c.get("drift_start_time", np.nan) for c in contexts], dtype=np.float64) # nan: not started
+        
+        # Device-specific result assembly (see _compile_output_builder)
+        self.build_output = _compile_output_builder(parameters)
+    
+    def carried_state(self) -> Dict[str, Dict[str, Any]]:
+        """param_id -> persistent state, in the same shape as the scalar parameter_states entries"""
+        state = {pid: {"current_value": v, "step": s}
+                 for pid, v, s in zip(self.linear_ids, self._linear_list(self.linear_values), self._linear_list(self.linear_steps))}
+        # Phase wraps every period, so this is the time within the current period
+        times = self.periodic_phases / self.periodic_scales
+        state.update((pid, {"time": t}) for pid, t in zip(self.periodic_ids, times.tolist()))
+        state.update((pid, {"current_value": v}) for pid, v in zip(self.walk_ids, self.walk_values.tolist()))
+        return state
+    
+    def _linear_list(self, array: np.ndarray) -> List[Any]:
+        """LINEAR array -> Python values, with the integer slots as int"""
+        values = array.tolist()
+        for i in self.linear_int_slots:
+            values[i] = int(values[i])
+        return values
+    
+    def error_state(self) -> Dict[str, Dict[str, float]]:
+        """param_id -> drift state, in the same shape as the scalar error_context entries"""
+        return {pid: {"drift_accumulated": d, "drift_start_time": t}
+                for pid, d, t in zip(self.error_ids, self.error_drift.tolist(), self.error_drift_start.tolist())
+                if t == t} # started only (nan != nan)
+    
+    def generate(self, rng: np.random.Generator, out: Dict[str, Any]):
+        """Generate one tick for all batched parameters into out (keyed by parameter name)"""
+        if self.random_names:
+            out.update(zip(self.random_names, rng.uniform(self.random_lows, self.random_highs).tolist()))
+        
+        if self.bool_names:
+            out.update(zip(self.bool_names, (rng.random(len(self.bool_names)) < 0.5).tolist()))
+        
+        if self.linear_names:
+            # Branchless: flip the step wherever the proposed value leaves [min, max], then step
+            proposed = self.linear_values + self.linear_steps
+            overflow = (proposed > self.linear_maxs) | (proposed < self.linear_mins)
+            np.negative(self.linear_steps, out=self.linear_steps, where=overflow)
+            self.linear_values += self.linear_steps
+            out.update(zip(self.linear_names, self._linear_list(self.linear_values)))
+        
+        if self.periodic_names:
+            idx = self.periodic_phases.astype(np.int64) & _SIN_TABLE_MASK
+            values = self.periodic_offsets + self.periodic_amplitudes * _SIN_TABLE[idx]
+            # Phase accumulation, wrapped to one turn so it never loses precision
+            self.periodic_phases += self.periodic_scales
+            np.fmod(self.periodic_phases, _SIN_TABLE_SIZE, out=self.periodic_phases)
+            out.update(zip(self.periodic_names, values.tolist()))
+        
+        if self.walk_names:
+            deltas = rng.uniform(-self.walk_steps, self.walk_steps)
+            _step_random_walk(self.walk_values, deltas, self.walk_mins, self.walk_maxs)
+            out.update(zip(self.walk_names, self.walk_values.tolist()))
+
+    def apply_errors(self, values: Dict[str, Any], rng: np.random.Generator, now: float):
+        """
+        Apply MCAR / drift / anomaly / noise to every error parameter's value in place (keyed by name),
+        with the same per-value semantics as ErrorInjector.apply: one batched draw per decision per tick
+        now: the tick's time.monotonic(), shared by every drift reset check
+        """
+        if not self.error_count:
+            return
+        raw = [values.get(name) for name in self.error_names]
+        # Only numbers get numerical errors; bool is an int subclass and counts, as in ErrorInjector.apply
+        numeric_list = [isinstance(v, _NUMERIC_TYPES) for v in raw]
+        numeric = np.array(numeric_list, dtype=bool)
+        x = np.array([v if t else 0.0 for v, t in zip(raw, numeric_list)], dtype=np.float64)
+        
+        flips = rng.random((2, self.error_count))
+        noise = rng.standard_normal(self.error_count) * self.error_noise_stds
+        
+        # MCAR (Missing Completely At Random); dropped values skip the numerical errors
+        missing = flips[0] < self.error_mcar_rates
+        active = numeric & ~missing
+        
+        # Drift accumulates over time, with an optional reset after drift_reset_interval seconds.
+        # Branchless: compute the next state for every slot, commit it only where drifting
+        drifting = active & self.error_has_drift
+        started = np.where(np.isnan(self.error_drift_start), now, self.error_drift_start)
+        expired = now - started > self.error_reset_intervals
+        np.copyto(self.error_drift, np.where(expired, 0.0, self.error_drift + self.error_drift_rates), where=drifting)
+        np.copyto(self.error_drift_start, np.where(expired, now, started), where=drifting)
+        x += self.error_drift * drifting
+        
+        # Anomaly (Spike), then Gaussian noise
+        spiked = active & (flips[1] < self.error_anomaly_rates)
+        x *= np.where(spiked, self.error_anomaly_mults, 1.0)
+        x += noise * active
+        
+        # Values no numerical error touched keep their original object (an int/bool stays an int/bool)
+        changed = (drifting | spiked | (active & (self.error_noise_stds > 0))).tolist()
+        for name, v, c, m, r in zip(self.error_names, raw, changed, missing.tolist(), x.tolist()):
+            values[name] = None if m else (r if c else v)
+
+def _compile_output_builder(parameters: List[Parameter]):
+    """
+    Emit a function specialized to this parameter list that maps final values (by name)
+    to the result dict (by id). Ids/names are embedded via repr().
+
+    build_output(values) -> {param_id: value}
+    """
+    lines = ["def build_output(values):"]
+    lines.append("    return {" + ", ".join(f"{p.id!r}: values.get({p.name!r})" for p in parameters) + "}")
+    
+    namespace: Dict[str, Any] = {}
+    code = compile("\n".join(lines), "<build_output>", "exec")
+    exec(code, namespace)
+    return namespace["build_output"]
+
+_NUMERIC_TYPES = (int, float)
+
+def _or_default(value: Any, default: Any) -> Any:
+    return value if value is not None else default
+
+def _step_random_walk_numpy(values: np.ndarray, deltas: np.ndarray, mins: np.ndarray, maxs: np.ndarray):
+    np.clip(values + deltas, mins, maxs, out=values)
+
+if NUMBA_AVAILABLE:
+    # No fastmath: min/max bounds use +/-inf for unbounded parameters.
+    # min/max on floats lower to branchless minsd/maxsd.
+    # Explicit signature (contiguous float64 arrays, as built by ParameterBatch): compiled eagerly at
+    # import and loaded from the on-disk cache on warm starts, with no type inference on first call
+    @njit("void(f8[::1], f8[::1], f8[::1], f8[::1])", cache=_NUMBA_CACHE)
+    def _step_random_walk(values, deltas, mins, maxs):
+        for i in range(values.shape[0]):
+            values[i] = min(max(values[i] + deltas[i], mins[i]), maxs[i])
+else:
+    _step_random_walk = _step_random_walk_numpy
+
+def warmup_kernels():
+    """
+    Bind JIT kernels ahead of the first tick (no-op without Numba).
+    Signatures are explicit, so the machine code already exists (compiled or loaded from the
+    cache under __pycache__, or NUMBA_CACHE_DIR); one dummy call per kernel binds the dispatchers
+    """
+    if NUMBA_AVAILABLE:
+        one = np.zeros(1, dtype=np.float64)
+        _step_random_walk(one, one, np.full(1, -np.inf), np.full(1, np.inf))
+        _physics_step(0.0, 0.0, 0.0, 1.0, 0.0, False, 0.0)
+
+# --- 6. State Management ---
 class DeviceState:
     def __init__(self):
         self.parameter_states: Dict[str, Dict[str, Any]] = {} # param_id -> params
         self.physics_state: Dict[str, float] = {"position": 0.0, "velocity": 0.0}
         self.error_context: Dict[str, Dict[str, Any]] = {} # param_id -> context
+        self.rng: np.random.Generator = np.random.default_rng() # shared by all parameters of the device
+        self.batch: Optional[ParameterBatch] = None
+        self.logic_rules: Optional[List[Dict[str, Any]]] = None # identity key of logic_engine
+        self.logic_engine: Optional[LogicEngine] = None
+    
+    def get_batch(self, parameters: List[Parameter]) -> ParameterBatch:
+        """Return the vectorized batch for this parameter list, rebuilding it when the list changes"""
+        if self.batch is None or self.batch.parameters is not parameters:
+            if self.batch is not None:
+                # Drift state outlives the batch (a parameter may move between lists)
+                self.error_context.update(self.batch.error_state())
+            self.batch = ParameterBatch(parameters, self.batch, self.parameter_states, self.error_context)
+        return self.batch
+    
+    def get_logic_engine(self, rules: List[Dict[str, Any]]) -> LogicEngine:
+        """Return the compiled rules for this rule list; the text-keyed compile cache is only consulted on change"""
+        if self.logic_engine is None or self.logic_rules is not rules:
+            self.logic_engine = LogicEngine.compile(rules)
+            self.logic_rules = rules
+        return self.logic_engine
 
 class SimulationStateManager:
     _states: Dict[str, DeviceState] = {} # device_id -> DeviceState
     
     @staticmethod
     def get_state(device_id: str) -> DeviceState:
-        if device_id not in SimulationStateManager._states:
-            SimulationStateManager._states[device_id] = DeviceState()
-        return SimulationStateManager._states[device_id]
+        # Single lookup on the fast path; setdefault keeps one state if two workers race on a new device
+        state = SimulationStateManager._states.get(device_id)
+        if state is None:
+            state = SimulationStateManager._states.setdefault(device_id, DeviceState())
+        return state
         
     @staticmethod
     def clear_state(device_id: str):
-        if device_id in SimulationStateManager._states:
-            del SimulationStateManager._states[device_id]
+        SimulationStateManager._states.pop(device_id, None)
@@ -1,53 +1,57 @@
-from typing import List, Optional
-from models.simulation_model import SimulationModel, SimulationModelDB, Base
-from services.database_service import SessionLocal, engine
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from models.simulation_model import SimulationModel, SimulationModelDB
+from models.device import Parameter
+from services.database_service import ScopedSession, release_session, json_loads
+from sqlalchemy import bindparam, select
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-import json
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+# One compiled serializer for the whole parameter list (JSON column takes Python objects)
+_PARAMETERS_ADAPTER = TypeAdapter(List[Parameter])
+
+# Statements built once; SQLAlchemy's compiled cache keys on the construct, values are bound per call
+_ALL_MODELS_STMT = select(SimulationModelDB)
+_NAME_EXISTS_STMT = select(SimulationModelDB.id).where(SimulationModelDB.name == bindparam("name")).limit(1)
+
+def _json_field(value, default):
+    """JSON 列已由 SQLAlchemy 解码；字符串仅出现在历史数据中（写入时被二次编码），此时再解析一次"""
+    if not value:
+        return default
+    if isinstance(value, str):
+        try:
+            return json_loads(value)
+        except ValueError: # json / orjson JSONDecodeError
+            return default
+    return value
 
 class SimulationModelService:
     @staticmethod
-    def _get_db() -> Session:
-        """获取数据库会话"""
-        return SessionLocal()
+    @contextmanager
+    def _db() -> Iterator[Session]:
+        """获取数据库会话（HTTP请求内共享同一会话）；异常时回滚，结束时释放"""
+        db = ScopedSession()
+        try:
+            yield db
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            release_session()
     
     @staticmethod
     def _db_to_pydantic(db_model: SimulationModelDB) -> SimulationModel:
-        """将数据库模型转换为Pydantic模型"""
-        parameters = db_model.parameters
-        if isinstance(parameters, str):
-            try:
-                parameters = json.loads(parameters)
-            except json.JSONDecodeError:
-                parameters = []
-        
-        # Handle JSON fields that might be strings or dicts
-        physics_config = db_model.physics_config or {}
-        if isinstance(physics_config, str):
-            try: physics_config = json.loads(physics_config)
-            except: physics_config = {}
-
-        logic_rules = db_model.logic_rules or []
-        if isinstance(logic_rules, str):
-            try: logic_rules = json.loads(logic_rules)
-            except: logic_rules = []
-
-        visual_config = db_model.visual_config or {}
-        if isinstance(visual_config, str):
-            try: visual_config = json.loads(visual_config)
-            except: visual_config = {}
-                
-        return SimulationModel(
+        """将数据库模型转换为Pydantic模型（数据库内容可信：仅校验参数列表，外层跳过校验）"""
+        parameters = _json_field(db_model.parameters, [])
+        return SimulationModel.model_construct(
             id=db_model.id,
             name=db_model.name,
             type=db_model.type or "custom",
             description=db_model.description,
-            parameters=parameters,
-            physics_config=physics_config,
-            visual_config=visual_config,
-            logic_rules=logic_rules,
+            parameters=[Parameter(**p) for p in parameters],
+            physics_config=_json_field(db_model.physics_config, {}),
+            visual_config=_json_field(db_model.visual_config, {}),
+            logic_rules=_json_field(db_model.logic_rules, []),
             created_at=db_model.created_at,
             updated_at=db_model.updated_at
         )
@@ -55,33 +59,26 @@ class SimulationModelService:
     @staticmethod
     def get_all_models() -> List[SimulationModel]:
         """获取所有数据模型"""
-        db = SimulationModelService._get_db()
-        try:
-            models_db = db.query(SimulationModelDB).all()
+        with SimulationModelService._db() as db:
+            models_db = db.execute(_ALL_MODELS_STMT).scalars().all()
             return [SimulationModelService._db_to_pydantic(m) for m in models_db]
-        finally:
-            db.close()
     
     @staticmethod
     def get_model_by_id(model_id: str) -> Optional[SimulationModel]:
         """根据ID获取数据模型"""
-        db = SimulationModelService._get_db()
-        try:
-            model_db = db.query(SimulationModelDB).filter(SimulationModelDB.id == model_id).first()
+        with SimulationModelService._db() as db:
+            # Primary-key lookup: identity map first, single SELECT otherwise
+            model_db = db.get(SimulationModelDB, model_id)
             if not model_db:
                 return None
             return SimulationModelService._db_to_pydantic(model_db)
-        finally:
-            db.close()
             
     @staticmethod
     def create_model(model: SimulationModel) -> SimulationModel:
         """创建数据模型"""
-        db = SimulationModelService._get_db()
-        try:
+        with SimulationModelService._db() as db:
             # 检查名称是否已存在
-            existing = db.query(SimulationModelDB).filter(SimulationModelDB.name == model.name).first()
-            if existing:
+            if db.execute(_NAME_EXISTS_STMT, {"name": model.name}).first():
                 raise ValueError(f"数据模型名称 {model.name} 已存在")
             
             db_obj = SimulationModelDB(
@@ -89,7 +86,7 @@ class SimulationModelService:
                 name=model.name,
                 type=model.type,
                 description=model.description,
-                parameters=[p.dict() for p in model.parameters],
+                parameters=_PARAMETERS_ADAPTER.dump_python(model.parameters),
                 physics_config=model.physics_config,
                 visual_config=model.visual_config,
                 logic_rules=model.logic_rules
@@ -99,25 +96,19 @@ class SimulationModelService:
             db.commit()
             db.refresh(db_obj)
             return SimulationModelService._db_to_pydantic(db_obj)
-        except Exception as e:
-            db.rollback()
-            raise e
-        finally:
-            db.close()
             
     @staticmethod
     def update_model(model_id: str, model_update: SimulationModel) -> Optional[SimulationModel]:
         """更新数据模型"""
-        db = SimulationModelService._get_db()
-        try:
-            db_obj = db.query(SimulationModelDB).filter(SimulationModelDB.id == model_id).first()
+        with SimulationModelService._db() as db:
+            db_obj = db.get(SimulationModelDB, model_id)
             if not db_obj:
                 return None
             
             db_obj.name = model_update.name
             db_obj.type = model_update.type
             db_obj.description = model_update.description
-            db_obj.parameters = [p.dict() for p in model_update.parameters]
+            db_obj.parameters = _PARAMETERS_ADAPTER.dump_python(model_update.parameters)
             db_obj.physics_config = model_update.physics_config
             db_obj.visual_config = model_update.visual_config
             db_obj.logic_rules = model_update.logic_rules
@@ -125,23 +116,15 @@ class SimulationModelService:
             db.commit()
             db.refresh(db_obj)
             return SimulationModelService._db_to_pydantic(db_obj)
-        except Exception as e:
-            db.rollback()
-            raise e
-        finally:
-            db.close()
             
     @staticmethod
     def delete_model(model_id: str) -> bool:
         """删除数据模型"""
-        db = SimulationModelService._get_db()
-        try:
-            db_obj = db.query(SimulationModelDB).filter(SimulationModelDB.id == model_id).first()
+        with SimulationModelService._db() as db:
+            db_obj = db.get(SimulationModelDB, model_id)
             if not db_obj:
                 return False
             
             db.delete(db_obj)
             db.commit()
             return True
-        finally:
-            db.close()
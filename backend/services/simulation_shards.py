@@ -0,0 +1,77 @@
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from models.device import Device
+from services.simulation_engine import warmup_kernels
+from utils.logger import logger
+
+# --- Shard process side ---
+# device_id -> (parameters, physics_config, logic_rules); DeviceState lives in this process's SimulationStateManager
+_configs: Dict[str, Tuple[Any, Any, Any]] = {}
+
+def _shard_tick(updates: Dict[str, Tuple[Any, Any, Any]], device_ids: List[str]) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """在分片进程中生成一批设备的数据：返回 [(device_id, data, error)]"""
+    from services.data_generator import DataGenerator
+    # Unpickled parameter lists are kept, so each device's ParameterBatch survives across ticks
+    _configs.update(updates)
+    results = []
+    for device_id in device_ids:
+        parameters, physics_config, logic_rules = _configs[device_id]
+        try:
+            results.append((device_id, DataGenerator.generate_device_data(device_id, parameters, physics_config, logic_rules), None))
+        except Exception as e:
+            results.append((device_id, None, str(e)))
+    return results
+
+# --- Main process side ---
+class ShardedSimulation:
+    """
+    多进程分片仿真：设备按 device_id 哈希固定分配到单进程分片，设备状态常驻在所属进程中。
+    设备之间互不影响，各分片独立推进，无需跨分片同步；设备配置仅在变化时发送。
+    """
+    def __init__(self, processes: int):
+        # spawn: the server process runs MQTT / Modbus / OPC UA threads, which must not be forked
+        self._context = multiprocessing.get_context("spawn")
+        self._shards = [self._new_shard() for _ in range(processes)]
+        self._sent: Dict[str, Any] = {} # device_id -> (parameters, physics_config, logic_rules) last sent
+
+    def _new_shard(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, mp_context=self._context, initializer=warmup_kernels)
+
+    def _shard_index(self, device_id: str) -> int:
+        # crc32 rather than hash(): stable regardless of PYTHONHASHSEED
+        return zlib.crc32(device_id.encode()) % len(self._shards)
+
+    def generate(self, devices: List[Device]) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """生成一个tick的设备数据：每个分片一次往返，返回 [(device_id, data, error)]"""
+        jobs = [({}, []) for _ in self._shards]
+        for device in devices:
+            updates, device_ids = jobs[self._shard_index(device.id)]
+            # DataWriter reloads devices every few seconds with fresh lists, so compare by value; the Parameter
+            # objects come from the device_service decode cache, so unchanged configs compare by identity
+            config = (tuple(device.parameters), device.physics_config, device.logic_rules)
+            if self._sent.get(device.id) != config:
+                updates[device.id] = (device.parameters, device.physics_config, device.logic_rules)
+                self._sent[device.id] = config
+            device_ids.append(device.id)
+
+        futures = [(i, self._shards[i].submit(_shard_tick, updates, device_ids))
+                   for i, (updates, device_ids) in enumerate(jobs) if device_ids]
+        results = []
+        for i, future in futures:
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                # Broken shard (e.g. the process died): replace it; its devices restart from fresh state
+                logger.error("Simulation shard %s failed: %s", i, e)
+                self._shards[i].shutdown(wait=False, cancel_futures=True)
+                self._shards[i] = self._new_shard()
+                self._sent = {k: v for k, v in self._sent.items() if self._shard_index(k) != i}
+        return results
+
+    def shutdown(self):
+        for shard in self._shards:
+            shard.shutdown(wait=True, cancel_futures=True)
+        self._shards = []
+        self._sent = {}
@@ -1,16 +1,162 @@
 import taos
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
+import time
 import base64
-import json
-from typing import List, Dict, Any
+import functools
+import queue
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
 from config.config import settings
 from services.config_service import ConfigService
-from models.device import Device
+from services.database_service import json_loads
+from models.device import Device, TYPE_NUMBER, TYPE_BOOLEAN, TYPE_STRING
+from utils.logger import logger
+
+# ijson is optional: incremental decoding of large REST query responses
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+def _epoch_ms(ts) -> int:
+    """数据时间戳（ISO字符串，无时区视为UTC；或毫秒整数）-> 毫秒时间戳"""
+    if ts is None:
+        return int(datetime.now(timezone.utc).timestamp() * 1000)
+    if isinstance(ts, int):
+        return ts
+    if isinstance(ts, str) and ts.endswith("Z"):
+        ts = ts[:-1]
+    dt = ts if isinstance(ts, datetime) else datetime.fromisoformat(ts)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return round(dt.timestamp() * 1000)
+
+def _bind_column(bind, values: List[Any]):
+    """按列值类型绑定一列（bool -> BOOL，str -> NCHAR，其余 -> DOUBLE）"""
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, bool):
+        bind.bool(values)
+    elif isinstance(sample, str):
+        bind.nchar(values)
+    else:
+        bind.double([None if v is None else float(v) for v in values])
+
+# SQL literal formatters by exact value type: one dict lookup instead of an isinstance chain per value
+def _sql_bool(value: bool) -> str:
+    # TDengine BOOL uses true/false or 1/0
+    return "true" if value else "false"
+
+# Quote and backslash escaped in one C-level pass (no per-character branching in Python)
+_SQL_STRING_ESCAPES = str.maketrans({"'": "\\'", "\\": "\\\\"})
+
+def _sql_string(value: str) -> str:
+    return "'" + value.translate(_SQL_STRING_ESCAPES) + "'"
+
+def _sql_other(value: Any) -> str:
+    """子类等未登记类型（如 numpy 标量），按原有规则判断"""
+    if isinstance(value, str):
+        return _sql_string(value)
+    if isinstance(value, bool):
+        return _sql_bool(value)
+    return str(value)
+
+_SQL_FORMATTERS = {float: str, int: str, bool: _sql_bool, str: _sql_string, type(None): lambda value: "NULL"}
+
+def _sql_value(value: Any) -> str:
+    return _SQL_FORMATTERS.get(type(value), _sql_other)(value)
+
+def _column_formatter(values: List[Any]):
+    """按整列值类型选定一次格式化函数；类型混杂的列使用逐值分派"""
+    types = set(map(type, values))
+    has_null = type(None) in types
+    types.discard(type(None))
+    if len(types) != 1:
+        return _sql_value
+    fmt = _SQL_FORMATTERS.get(types.pop())
+    if fmt is None:
+        return _sql_value
+    if has_null:
+        return lambda value: "NULL" if value is None else fmt(value)
+    return fmt
+
+# InfluxDB line protocol (schemaless): measurement / key and string-field escaping
+_LINE_MEASUREMENT_ESCAPES = str.maketrans({",": "\\,", " ": "\\ "})
+_LINE_KEY_ESCAPES = str.maketrans({",": "\\,", "=": "\\=", " ": "\\ "})
+_LINE_STRING_ESCAPES = str.maketrans({'"': '\\"', "\\": "\\\\"})
+
+def _line_field(value: Any) -> str:
+    """行协议字段值：bool -> BOOL，str -> NCHAR (L"...")，其余 -> DOUBLE（与建表类型一致）"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return 'L"' + value.translate(_LINE_STRING_ESCAPES) + '"'
+    return repr(float(value))
+
+# The measurement + tag prefix and escaped field keys repeat on every line, so they are formatted once
+@functools.lru_cache(maxsize=8192)
+def _line_prefix(super_table: str, table_name: str) -> str:
+    return f"{super_table.translate(_LINE_MEASUREMENT_ESCAPES)},tname={table_name} "
+
+@functools.lru_cache(maxsize=8192)
+def _line_key(key: str) -> str:
+    return key.translate(_LINE_KEY_ESCAPES) + "="
+
+def _line_protocol(super_table: str, table_name: str, data: Dict[str, Any]) -> str:
+    """单行数据 -> `stable,tname=device_x k=v,... ts_ms`（None 字段省略，即 NULL）"""
+    fields = ",".join([_line_key(k) + _line_field(v) for k, v in data["data"].items() if v is not None])
+    return f"{_line_prefix(super_table, table_name)}{fields} {_epoch_ms(data.get('timestamp'))}"
+
+# 参数类型 -> TDengine 列类型（中文类型值与英文名均可）
+_TDENGINE_TYPES = {
+    TYPE_NUMBER: "DOUBLE", "NUMBER": "DOUBLE",
+    TYPE_BOOLEAN: "BOOL", "BOOLEAN": "BOOL",
+    TYPE_STRING: "NCHAR(255)", "STRING": "NCHAR(255)",
+}
+
+# Device table names and the default "latest rows" query are formatted once per device, not per call
+@functools.lru_cache(maxsize=8192)
+def _device_table(device_id: str) -> str:
+    return f"`device_{device_id}`"
+
+@functools.lru_cache(maxsize=4096)
+def _latest_data_sql(device_id: str, limit: int) -> str:
+    return f"SELECT * FROM {_device_table(device_id)} ORDER BY ts DESC LIMIT {limit}"
+
+def _sql_ident(name: str) -> str:
+    """标识符加反引号"""
+    return f"`{name}`"
+
+# Tag value lookup per super table: only the tbname literal differs between calls
+@functools.lru_cache(maxsize=256)
+def _tag_values_sql(stable_name: str, tags: Tuple[str, ...]) -> str:
+    return f"SELECT {', '.join(map(_sql_ident, tags))} FROM {_sql_ident(stable_name)} WHERE tbname = "
 
 class TDengineService:
+    # 异步写入批处理：insert_data 入队后立即返回，后台线程按设备合并为多 VALUES 的 INSERT
+    WRITE_BATCH_SIZE = 256 # rows per device that trigger an immediate flush (and max rows per INSERT)
+    WRITE_BATCH_TIMEOUT = 0.01 # seconds a background batch waits for more rows after its first one
+    # REST 批量写入：按 REST_BATCH_ROWS 行拆分为多条 INSERT，最多 REST_CONCURRENCY 条并发发送
+    REST_BATCH_ROWS = 32
+    REST_CONCURRENCY = 8
+    # 多表 INSERT 按字符数拆分，低于 TDengine SQL 长度上限（maxSQLLength 1MB）
+    MAX_SQL_LENGTH = 700_000
+    # 批量建子表：每条 CREATE TABLE 语句最多包含的子表数
+    SUB_TABLES_PER_STATEMENT = 1000
+
     def _load_config(self):
-        """从数据库加载TDengine配置"""
+        """从数据库加载TDengine配置（配置版本未变化时跳过）"""
+        if self._config_version is not None and self._config_version == ConfigService.get_tdengine_config_version():
+            return
         config = ConfigService.get_tdengine_connection_params()
+        # None while the config could not be read from the DB (defaults in use): retried on next connect
+        self._config_version = ConfigService.get_tdengine_config_version()
         self.host = config.get("host", "localhost")
         self.port = int(config.get("port", 6030))
         self.user = config.get("user", "root")
@@ -19,11 +165,53 @@ class TDengineService:
         
         # 判断连接模式：端口6041使用REST API，其他使用Native
         self.use_rest = (self.port == 6041)
+        # The database may have changed: table knowledge is reloaded on connect
+        self._known_tables = set()
+        self._ensured_stables = {}
+        self._stable_tags = {} # super table -> TAG column names (describe_stable_tags)
+        # REST endpoints built once per config load, not per request
+        self._rest_url_no_db = f"http://{self.host}:{self.port}/rest/sql"
+        self._rest_url_with_db = f"{self._rest_url_no_db}/{self.database}" if self.database else self._rest_url_no_db
+        # Auth header encoded once per config load, not per request
+        self._session.headers.update(self._get_rest_headers())
     
     def __init__(self):
         """初始化TDengine服务"""
         self.conn = None
         self.use_rest = False
+        # Serializes connect / disconnect (Native statements run on pooled connections)
+        self._lock = threading.RLock()
+        # Native connection pool: one statement per connection at a time; None slots are reopened on acquire
+        self._pool = None
+        # Pool contention counters (see pool_stats()): waits are counted under a lock, they are the slow path anyway
+        self._pool_acquires = 0 # approximate
+        self._pool_waits = 0
+        self._pool_wait_seconds = 0.0
+        self._pool_stats_lock = threading.Lock()
+        # Connection state maintained by the health-check thread; the write path only reads this flag
+        self.connected = False
+        self.health_check_interval = 30.0 # seconds
+        self._health_thread = None
+        self._health_running = False
+        self._health_wakeup = threading.Event()
+        # REST: persistent keep-alive connections shared by all callers (DataWriter workers, API requests).
+        # Retries cover connection errors; POSTs are not re-sent after a read error (urllib3 default)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=Retry(total=2, backoff_factor=0.1))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._rest_executor = ThreadPoolExecutor(max_workers=self.REST_CONCURRENCY, thread_name_prefix="TDengineREST")
+        # insert_data queue: (device_id, column keys) -> rows; swapped out whole on each flush
+        self._write_queue = defaultdict(list)
+        self._write_lock = threading.Lock()
+        self._flush_lock = threading.Lock() # one flush at a time, so flush() waits for in-flight rows
+        self._write_wakeup = threading.Event()
+        self._writer_thread = None
+        self._config_version = None # ConfigService version of the loaded config
+        # Tables known to exist in the current database (names without backticks): skips CREATE ... IF NOT EXISTS round trips
+        self._known_tables = set()
+        # super table name -> parameter schema last created / evolved to: skips SHOW STABLES + DESCRIBE when unchanged
+        self._ensured_stables = {}
         self._load_config()  # 初始化时加载配置
     
     def _get_rest_headers(self):
@@ -35,34 +223,47 @@ class TDengineService:
             'Content-Type': 'text/plain'
         }
 
-    def _rest_execute(self, sql: str, use_db: bool = True) -> Dict:
-        """通过REST API执行SQL"""
-        url = f"http://{self.host}:{self.port}/rest/sql"
-        if use_db and self.database:
-            url = f"{url}/{self.database}"
-            
+    def _rest_execute(self, sql: Union[str, bytes], use_db: bool = True) -> Dict:
+        """通过REST API执行SQL（sql 可为已编码的 UTF-8 bytes）"""
+        url = self._rest_url_with_db if use_db else self._rest_url_no_db
         try:
-            response = requests.post(
-                url, 
-                headers=self._get_rest_headers(), 
-                data=sql.encode('utf-8')
-            )
+            response = self._session.post(url, data=sql if isinstance(sql, bytes) else sql.encode('utf-8'), timeout=(2, 30))
             
             if response.status_code != 200:
-                print(f"REST request failed: {response.status_code} - {response.text}")
+                logger.error("REST request failed: %s - %s", response.status_code, response.text)
                 return {"code": -1, "desc": f"HTTP {response.status_code}"}
                 
-            return response.json()
+            # orjson when available (falls back to json for NaN / Infinity)
+            return json_loads(response.content)
         except Exception as e:
-            print(f"REST execution error: {e}")
+            logger.error("REST execution error: %s", e)
             return {"code": -1, "desc": str(e)}
 
+    def _rest_execute_many(self, sqls: List[str]) -> bool:
+        """并发执行多条REST SQL（共享 keep-alive 连接池），全部成功返回True"""
+        if not self.conn:
+            if not self.connect():
+                raise Exception("无法连接到TDengine")
+        results = list(self._rest_executor.map(self._rest_execute, sqls))
+        failed = [res for res in results if not (res.get('code') == 0 or res.get('status') == 'succ')]
+        if failed:
+            raise Exception(f"{len(failed)}/{len(sqls)} statements failed: {failed[0]}")
+        return True
+
+    def invalidate_config(self):
+        """配置变更后调用：下次连接时重新加载配置"""
+        self._config_version = None
+
     def connect(self):
         """连接到TDengine数据库"""
-        # 每次连接前重新加载配置，确保使用最新配置
+        with self._lock:
+            return self._connect()
+
+    def _connect(self):
+        # 每次连接前检查配置版本，配置变更后使用最新配置
         self._load_config()
         
-        print(f"正在连接TDengine: host={self.host}, port={self.port}, user={self.user}, mode={'REST' if self.use_rest else 'Native'}")
+        logger.info("正在连接TDengine: host=%s, port=%s, user=%s, mode=%s", self.host, self.port, self.user, 'REST' if self.use_rest else 'Native')
         
         if self.use_rest:
             try:
@@ -72,56 +273,228 @@ class TDengineService:
                 
                 # 兼容 TDengine 2.x (status='succ') 和 3.x (code=0)
                 if res.get('code') == 0 or res.get('status') == 'succ':
-                    print("TDengine REST连接成功")
+                    logger.info("TDengine REST连接成功")
                     self.conn = True # 标记为已连接
                     self._create_database()
+                    self.connected = True
+                    self._load_known_tables()
                     return True
                 else:
-                    print(f"TDengine REST连接响应错误: {res}")
+                    logger.error("TDengine REST连接响应错误: %s", res)
+                    self.connected = False
                     return False
             except Exception as e:
-                print(f"TDengine REST连接异常: {e}")
+                logger.error("TDengine REST连接异常: %s", e)
+                self.connected = False
                 return False
         else:
             # Native连接方式
             try:
-                self.conn = taos.connect(
-                    host=self.host,
-                    port=self.port,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database
-                )
-                print("TDengine Native连接成功")
+                self._close_pool()
+                self.conn = None
+                self.conn = self._open_native(use_database=False)
+                logger.info("TDengine Native连接成功")
                 # 创建数据库（如果不存在）
                 self._create_database()
                 # 切换到该数据库
                 self.conn.execute(f"USE {self.database}")
+                # 连接池：首个连接加入池中，其余连接首次借用时再打开
+                pool = queue.Queue(maxsize=max(1, settings.tdengine_pool_size))
+                pool.put(self.conn)
+                for _ in range(pool.maxsize - 1):
+                    pool.put(None)
+                self._pool = pool
+                self.connected = True
+                self._load_known_tables()
                 return True
             except Exception as e:
-                print(f"连接TDengine Native失败: {e}")
-                print(f"错误详情: {str(e)}")
+                logger.error("连接TDengine Native失败: %s", e)
+                self.connected = False
                 return False
 
+    def _open_native(self, use_database: bool = True):
+        # The bootstrap connection opens without a database: it may not exist before _create_database()
+        params = dict(host=self.host, port=self.port, user=self.user, password=self.password)
+        if use_database:
+            params["database"] = self.database
+        return taos.connect(**params)
+
+    @contextmanager
+    def _acquire(self):
+        """从连接池借用一个Native连接；语句执行异常时丢弃该连接（下次借用时重新打开）"""
+        pool = self._pool
+        if pool is None:
+            raise Exception("TDengine Native连接未建立")
+        self._pool_acquires += 1
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            # Every connection is busy: wait, and record it so the pool can be sized (tdengine_pool_size)
+            started = time.perf_counter()
+            conn = pool.get()
+            with self._pool_stats_lock:
+                self._pool_waits += 1
+                self._pool_wait_seconds += time.perf_counter() - started
+        try:
+            if conn is None:
+                conn = self._open_native()
+            yield conn
+        except Exception:
+            if conn is not None:
+                try:
+                    conn.close()
+                except:
+                    pass
+            conn = None
+            raise
+        finally:
+            pool.put(conn)
+
+    def _get_stmt(self, conn, columns: Tuple[str, ...]):
+        """获取连接上按列集合缓存的 INSERT 预编译语句（表名每次通过 set_tbname 绑定）"""
+        # Prepared statements belong to their connection, so the cache lives on it
+        stmts = conn.__dict__.setdefault("_insert_stmts", {})
+        stmt = stmts.get(columns)
+        if stmt is None:
+            columns_sql = ", ".join(["ts"] + [f"`{c}`" for c in columns])
+            placeholders = ", ".join(["?"] * (len(columns) + 1))
+            stmt = stmts[columns] = conn.statement(f"INSERT INTO ? ({columns_sql}) VALUES ({placeholders})")
+        return stmt
+
+    @staticmethod
+    def _column_binds(param_names: List[str], data_list: List[Dict[str, Any]]):
+        """按列（ts + 每个参数一列）构建一张表的绑定数据"""
+        binds = taos.new_multi_binds(len(param_names) + 1)
+        binds[0].timestamp([_epoch_ms(data.get("timestamp")) for data in data_list])
+        payloads = [data["data"] for data in data_list]
+        for i, param_name in enumerate(param_names, 1):
+            _bind_column(binds[i], [payload.get(param_name) for payload in payloads])
+        return binds
+
+    def _stmt_insert(self, param_names: List[str], tables: List[Tuple[str, List[Dict[str, Any]]]]):
+        """
+        Native参数绑定批量写入：二进制列数据，无SQL文本拼接与解析。
+        列相同的多张表在同一语句上依次 set_tbname + 绑定，一次 execute 写入
+        :param tables: [(table_name, data_list), ...]
+        """
+        binds = [(table_name, self._column_binds(param_names, data_list)) for table_name, data_list in tables]
+        with self._acquire() as conn:
+            stmt = self._get_stmt(conn, tuple(param_names))
+            for table_name, table_binds in binds:
+                stmt.set_tbname(table_name)
+                stmt.bind_param_batch(table_binds)
+            stmt.execute()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Native连接池使用情况：借用次数、因无空闲连接而等待的次数与累计等待时间"""
+        pool = self._pool
+        return {
+            "size": pool.maxsize if pool is not None else 0,
+            "available": pool.qsize() if pool is not None else 0,
+            "acquires": self._pool_acquires,
+            "waits": self._pool_waits,
+            "wait_seconds": round(self._pool_wait_seconds, 3),
+        }
+
+    def _close_pool(self):
+        """关闭连接池中的空闲连接（借出中的连接归还到旧池后随之释放）"""
+        pool, self._pool = self._pool, None
+        while pool is not None:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                try:
+                    conn.close()
+                except:
+                    pass
+
     def check_connection(self) -> bool:
-        """检查连接状态，如果未连接尝试连接"""
-        if self.conn:
-            # 如果已连接，直接返回True
-            # 注意：Native模式下连接可能断开，但为了性能，这里不做实时检测
-            # 实际操作失败时会自动重连
-            return True
+        """检查连接状态：已连接时做一次 SERVER_VERSION() 往返（不断开共享连接），未连接时尝试连接"""
+        if not self.conn:
+            return self.connect()
         
-        # 尝试连接
-        return self.connect()
+        try:
+            alive = self._ping()
+        except Exception as e:
+            logger.warning("TDengine ping失败: %s", e)
+            alive = False
+        self.connected = alive
+        return alive
     
     def disconnect(self):
         """断开与TDengine的连接"""
-        if not self.use_rest and self.conn:
-            try:
-                self.conn.close()
-            except:
-                pass
+        # Write out queued insert_data rows on the current connection first
+        self.flush()
+        if not self.use_rest:
+            with self._lock:
+                self._close_pool()
+        # Drop pooled REST connections (the session reconnects on next use)
+        self._session.close()
         self.conn = None
+        self.connected = False
+        # 健康检查线程运行中则立即重连，避免写入中断一个检查周期
+        self._health_wakeup.set()
+    
+    def mark_disconnected(self):
+        """写入失败时调用：标记连接断开并唤醒健康检查线程重连"""
+        self.connected = False
+        self._health_wakeup.set()
+    
+    def start_health_check(self):
+        """启动后台健康检查线程（维护 self.connected）"""
+        if self._health_running:
+            return
+        self._health_running = True
+        self._health_wakeup.set() # 启动后立即检查一次
+        self._health_thread = threading.Thread(target=self._health_check_loop, name="TDengineHealthCheck", daemon=True)
+        self._health_thread.start()
+    
+    def stop_health_check(self):
+        """停止后台健康检查线程"""
+        if not self._health_running:
+            return
+        self._health_running = False
+        self._health_wakeup.set()
+        if self._health_thread:
+            self._health_thread.join()
+            self._health_thread = None
+    
+    def _health_check_loop(self):
+        """每 health_check_interval 秒 ping 一次；未连接时尝试重连"""
+        while self._health_running:
+            self._health_wakeup.wait(self.health_check_interval)
+            self._health_wakeup.clear()
+            if not self._health_running:
+                break
+            try:
+                if not ConfigService.is_tdengine_enabled():
+                    continue
+                if self.conn and self._ping():
+                    self.connected = True
+                else:
+                    self.connected = False
+                    self.connect()
+            except Exception as e:
+                logger.warning("TDengine健康检查失败: %s", e)
+                self.connected = False
+    
+    def _ping(self) -> bool:
+        """SELECT SERVER_VERSION() 往返检测"""
+        if self.use_rest:
+            res = self._rest_execute("SELECT SERVER_VERSION()", use_db=False)
+            return res.get('code') == 0 or res.get('status') == 'succ'
+        try:
+            with self._acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT SERVER_VERSION()")
+                cursor.fetchall()
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.warning("TDengine ping失败: %s", e)
+            return False
     
     def _create_database(self):
         """创建数据库（如果不存在）"""
@@ -134,62 +507,134 @@ class TDengineService:
                 # 不切换数据库，直接创建
                 self.conn.execute(sql)
             except Exception as e:
-                print(f"创建数据库失败: {e}")
+                logger.error("创建数据库失败: %s", e)
     
+    def _load_known_tables(self):
+        """连接建立后一次性加载库中已有的表名（TDengine 3.x information_schema；2.x 下为空集，按需累积）"""
+        result = self._fetch(f"SELECT table_name FROM information_schema.ins_tables WHERE db_name = '{self.database}'")
+        if result is not None:
+            self._known_tables = {row[0] for row in result[1]}
+
     def execute_query(self, sql: str) -> List[Dict[str, Any]]:
-        """执行查询SQL"""
+        """执行查询SQL（按行返回：每行一个 dict）"""
+        result = self._fetch(sql)
+        if result is None:
+            return []
+        cols, data = result
+        return [dict(zip(cols, row)) for row in data]
+
+    def execute_query_columnar(self, sql: str) -> Dict[str, list]:
+        """执行查询SQL（按列返回：列名 -> 值列表），大结果集不为每行构建 dict"""
+        result = self._fetch(sql)
+        if result is None:
+            return {}
+        cols, data = result
+        columns = zip(*data) if data else ([] for _ in cols)
+        return {c: list(values) for c, values in zip(cols, columns)}
+
+    def iter_query(self, sql: str) -> Iterator[Dict[str, Any]]:
+        """
+        执行查询SQL并逐行产出 dict（大结果集不整体驻留内存）：
+        REST 模式流式读取响应并用 ijson 增量解析（未安装时整体解析），Native 模式逐块读取游标
+        """
         if not self.conn:
             if not self.connect():
-                return []
+                return
+        if not self.use_rest:
+            yield from self._native_iter(sql)
+        elif IJSON_AVAILABLE:
+            yield from self._rest_iter(sql)
+        else:
+            yield from self.execute_query(sql)
+
+    def _native_iter(self, sql: str) -> Iterator[Dict[str, Any]]:
+        # The pooled connection is held until the caller finishes (or closes) the iterator
+        with self._acquire() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql)
+                columns = [desc[0] for desc in cursor.description]
+                for row in cursor:
+                    yield dict(zip(columns, row))
+            finally:
+                cursor.close()
+
+    def _rest_iter(self, sql: Union[str, bytes]) -> Iterator[Dict[str, Any]]:
+        data = sql if isinstance(sql, bytes) else sql.encode('utf-8')
+        with self._session.post(self._rest_url_with_db, data=data, timeout=(2, 30), stream=True) as response:
+            if response.status_code != 200:
+                logger.error("REST request failed: %s - %s", response.status_code, response.text)
+                return
+            response.raw.decode_content = True
+            # Rows are scalar arrays under "data"; column names come first ("column_meta" in 3.x, "head" in 2.x)
+            cols, row, meta_index = [], None, 0
+            for prefix, event, value in ijson.parse(response.raw, use_float=True):
+                if prefix == 'data.item.item':
+                    row.append(value)
+                elif prefix == 'data.item':
+                    if event == 'start_array':
+                        row = []
+                    else:
+                        yield dict(zip(cols, row))
+                elif prefix == 'column_meta.item.item':
+                    # [name, type, length]: keep the name
+                    if meta_index == 0:
+                        cols.append(value)
+                    meta_index += 1
+                elif prefix == 'column_meta.item':
+                    meta_index = 0
+                elif prefix == 'head.item':
+                    cols.append(value)
+                elif prefix == 'code' and value != 0:
+                    logger.error("查询返回错误: code=%s", value)
+                    return
+                elif prefix == 'status' and value != 'succ':
+                    logger.error("查询返回错误: status=%s", value)
+                    return
+
+    def _fetch(self, sql: str) -> Optional[Tuple[List[str], List[Any]]]:
+        """执行查询，返回 (列名, 行列表)；失败返回 None"""
+        if not self.conn:
+            if not self.connect():
+                return None
         
         if self.use_rest:
             res = self._rest_execute(sql)
-            # 处理结果
-            if res.get('code') == 0:
-                # TDengine 3.x format: {"code":0, "column_meta":[[name, type, len],...], "data":[[...]]}
-                if 'column_meta' in res and 'data' in res:
-                    cols = [meta[0] for meta in res['column_meta']]
-                    # print(f"DEBUG: SQL='{sql}' Cols={cols}")  # Uncomment for debugging
-                    data = res['data']
-                    return [dict(zip(cols, row)) for row in data]
-                # TDengine 2.x format: {"status":"succ", "head":[...], "data":[[...]]}
-                elif 'head' in res and 'data' in res:
-                    cols = res['head']
-                    data = res['data']
-                    return [dict(zip(cols, row)) for row in data]
-            elif res.get('status') == 'succ':
-                cols = res.get('head', [])
-                data = res.get('data', [])
-                return [dict(zip(cols, row)) for row in data]
+            # 处理结果（一次判断成功，再按格式取列名）
+            # TDengine 3.x format: {"code":0, "column_meta":[[name, type, len],...], "data":[[...]]}
+            # TDengine 2.x format: {"status":"succ", "head":[...], "data":[[...]]}
+            if res.get('code') == 0 or res.get('status') == 'succ':
+                meta = res.get('column_meta')
+                cols = [m[0] for m in meta] if meta else res.get('head') or []
+                return cols, res.get('data') or []
             
-            print(f"查询返回错误: {res}")
-            return []
+            logger.error("查询返回错误: %s", res)
+            return None
             
         else:
             # Native implementation
-            try:
-                cursor = self.conn.cursor()
+            return self._native_query(sql)
+
+    def _native_query(self, sql: str) -> Optional[Tuple[List[str], List[Any]]]:
+        """Native查询（使用连接池中的连接）"""
+        try:
+            with self._acquire() as conn:
+                cursor = conn.cursor()
                 cursor.execute(sql)
                 
                 # 获取列名
                 columns = [desc[0] for desc in cursor.description]
                 
                 # 获取结果
-                result = []
-                for row in cursor.fetchall():
-                    result.append(dict(zip(columns, row)))
+                data = cursor.fetchall()
                 
                 cursor.close()
-                return result
-            except Exception as e:
-                print(f"执行查询失败: {e}")
-                # 尝试重连
-                try:
-                    self.connect()
-                except:
-                    pass
-                return []
-    
+                return columns, data
+        except Exception as e:
+            # 失败的连接已被丢弃，下次借用时重新打开
+            logger.error("执行查询失败: %s", e)
+            return None
+
     def execute_update(self, sql: str) -> int:
         """执行更新SQL（INSERT、UPDATE、DELETE等）"""
         if not self.conn:
@@ -202,22 +647,53 @@ class TDengineService:
                 return res.get('rows', 1)
             raise Exception(f"Update failed: {res}")
         else:
+            return self._native_update(sql)
+
+    def execute_batch(self, sqls: List[str]) -> int:
+        """
+        顺序执行多条更新SQL（如 Schema Evolution 的 ALTER），共用一个连接，遇错即停。
+        TDengine 每个请求只执行一条语句，且 ALTER STABLE 每条只能增加一列，因此无法合并为单条SQL
+        """
+        if not sqls:
+            return 0
+        if not self.conn:
+            if not self.connect():
+                raise Exception("无法连接到TDengine")
+        
+        if self.use_rest:
+            # Back-to-back on the keep-alive session (not concurrent: ALTERs on one stable conflict)
+            for sql in sqls:
+                res = self._rest_execute(sql)
+                if not (res.get('code') == 0 or res.get('status') == 'succ'):
+                    raise Exception(f"Update failed: {sql}: {res}")
+            return len(sqls)
+        with self._acquire() as conn:
+            cursor = conn.cursor()
             try:
-                cursor = self.conn.cursor()
-                rows = cursor.execute(sql)
+                for sql in sqls:
+                    cursor.execute(sql)
+            finally:
                 cursor.close()
-                return rows
-            except Exception as e:
-                # Try reconnect
-                try:
-                    self.connect()
-                    cursor = self.conn.cursor()
-                    rows = cursor.execute(sql)
-                    cursor.close()
-                    return rows
-                except:
-                    pass
-                raise e
+        return len(sqls)
+
+    def _native_update_once(self, sql: str) -> int:
+        with self._acquire() as conn:
+            cursor = conn.cursor()
+            rows = cursor.execute(sql)
+            cursor.close()
+            return rows
+
+    def _native_update(self, sql: str) -> int:
+        """Native更新（使用连接池中的连接）"""
+        try:
+            return self._native_update_once(sql)
+        except Exception as e:
+            # The failed connection was discarded: retry once on a fresh one
+            try:
+                return self._native_update_once(sql)
+            except:
+                pass
+            raise e
 
     def get_stables(self) -> List[Dict[str, Any]]:
         """获取所有超级表"""
@@ -230,7 +706,7 @@ class TDengineService:
         # 1. 尝试从 information_schema 获取 (TDengine 3.x)
         try:
             # 注意：需要指定 db_name，否则可能查不到或查到其他库的
-            sql = f"SELECT table_name FROM information_schema.ins_tables WHERE stable_name = '{stable_name}' AND db_name = '{self.database}'"
+            sql = f"SELECT table_name FROM information_schema.ins_tables WHERE stable_name = {_sql_string(stable_name)} AND db_name = '{self.database}'"
             rows = self.execute_query(sql)
             # 如果查询成功（没有抛出异常），即使为空也返回，因为这意味着它是3.x且确实没有表（或者我们查询正确）
             # 但为了保险，如果为空，我们还是尝试一下后续方法，万一 information_schema 行为不符合预期
@@ -258,7 +734,7 @@ class TDengineService:
             # 统一返回格式
             return [{'table_name': r['tbname']} for r in rows if 'tbname' in r]
         except Exception as e:
-            print(f"Get tables fallback failed: {e}")
+            logger.error("Get tables fallback failed: %s", e)
             return []
 
     def describe_table(self, table_name: str) -> List[Dict[str, Any]]:
@@ -272,10 +748,13 @@ class TDengineService:
         rows = self.execute_query(sql)
         return rows
     
-    def get_table_info(self, stable_name: str, table_name: str) -> Dict[str, Any]:
-        """获取子表信息（包括Tags）"""
-        # 1. 获取超级表结构以确定Tag列
-        # describe_table now handles backticks
+    def describe_stable_tags(self, stable_name: str) -> Tuple[str, ...]:
+        """获取超级表的Tag列名（缓存；超级表结构由 create_super_table 变更时失效）"""
+        tags = self._stable_tags.get(stable_name)
+        if tags is not None:
+            return tags
+        
+        # describe_table handles backticks
         schema = self.describe_table(stable_name)
         
         # Handle case sensitivity for schema keys
@@ -286,25 +765,34 @@ class TDengineService:
             note = col.get('Note') or col.get('note')
             if note == 'TAG':
                 tags.append(field)
-        
-        info = {
+        tags = tuple(tags)
+        # An empty result may be a failed query: not cached
+        if schema:
+            self._stable_tags[stable_name] = tags
+        return tags
+    
+    def get_table_info(self, stable_name: str, table_name: str) -> Dict[str, Any]:
+        """获取子表信息（包括Tags）"""
+        return {
             "table_name": table_name,
             "stable_name": stable_name,
-            "tags": {}
+            "tags": self.get_tag_values(stable_name, table_name)
         }
+    
+    def get_tag_values(self, stable_name: str, table_name: str) -> Dict[str, Any]:
+        """获取子表的Tag值（Tag列来自 describe_stable_tags）"""
+        tags = self.describe_stable_tags(stable_name)
+        if not tags:
+            return {}
         
-        if tags:
-            # Query tag values
-            cols = ", ".join([f"`{t}`" for t in tags])
-            sql = f"SELECT {cols} FROM `{stable_name}` WHERE tbname = '{table_name}' LIMIT 1"
-            try:
-                res = self.execute_query(sql)
-                if res:
-                    info["tags"] = res[0]
-            except Exception as e:
-                print(f"Failed to get tags: {e}")
-        
-        return info
+        sql = f"{_tag_values_sql(stable_name, tags)}{_sql_string(table_name)} LIMIT 1"
+        try:
+            res = self.execute_query(sql)
+            if res:
+                return res[0]
+        except Exception as e:
+            logger.error("Failed to get tags: %s", e)
+        return {}
 
     def get_table_data(self, table_name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """获取表数据"""
@@ -313,35 +801,31 @@ class TDengineService:
 
     def create_table_for_device(self, device: Device) -> bool:
         """为设备创建表 (独立表，不带Tags)"""
-        table_name = f"`device_{device.id}`"
+        if f"device_{device.id}" in self._known_tables:
+            return True
+        table_name = _device_table(device.id)
         
         # 构建表结构SQL
-        columns_sql = "ts TIMESTAMP"
-        for param in device.parameters:
-            col_type = self._get_tdengine_type(param.type)
-            col_name = param.id if hasattr(param, 'id') and param.id else param.name
-            columns_sql += f", `{col_name}` {col_type}"
+        columns_sql = ", ".join([
+            "ts TIMESTAMP",
+            *(f"`{param.id or param.name}` {self._get_tdengine_type(param.type)}" for param in device.parameters)
+        ])
         
         # 独立表不应该有TAGS
         sql = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_sql})"
         
         try:
             self.execute_update(sql)
+            self._known_tables.add(f"device_{device.id}")
             return True
         except Exception as e:
-            print(f"创建表失败: {e}")
+            logger.error("创建表失败: %s", e)
             return False
     
-    def _get_tdengine_type(self, param_type: str) -> str:
+    @staticmethod
+    def _get_tdengine_type(param_type: str) -> str:
         """将参数类型转换为TDengine数据类型"""
-        if param_type == "数值" or param_type == "NUMBER":
-            return "DOUBLE"
-        elif param_type == "布尔" or param_type == "BOOLEAN":
-            return "BOOL"
-        elif param_type == "字符串" or param_type == "STRING":
-            return "NCHAR(255)"
-        else:
-            return "DOUBLE"  # 默认使用DOUBLE类型
+        return _TDENGINE_TYPES.get(param_type, "DOUBLE")  # 默认使用DOUBLE类型
 
     def delete_device_data(self, device_id: str, start_time: str = None, end_time: str = None) -> bool:
         """
@@ -354,16 +838,16 @@ class TDengineService:
         if not self.conn and not self.connect():
             return False
             
-        table_name = f"`device_{device_id}`"
+        table_name = _device_table(device_id)
         
         try:
             sql = f"DELETE FROM {table_name}"
             conditions = []
             
             if start_time:
-                conditions.append(f"ts >= '{start_time}'")
+                conditions.append(f"ts >= {_sql_string(str(start_time))}")
             if end_time:
-                conditions.append(f"ts <= '{end_time}'")
+                conditions.append(f"ts <= {_sql_string(str(end_time))}")
                 
             if conditions:
                 sql += f" WHERE {' AND '.join(conditions)}"
@@ -373,21 +857,22 @@ class TDengineService:
                 # 安全起见，使用宽泛的时间范围
                 sql += " WHERE ts >= 0"
 
-            print(f"执行删除SQL: {sql}")
+            logger.debug("执行删除SQL: %s", sql)
             
             if self.use_rest:
                 res = self._rest_execute(sql)
                 if res.get('code') == 0 or res.get('status') == 'succ':
                     return True
                 else:
-                    print(f"删除数据失败 (REST): {res}")
+                    logger.error("删除数据失败 (REST): %s", res)
                     return False
             else:
-                self.conn.execute(sql)
+                with self._acquire() as conn:
+                    conn.execute(sql)
                 return True
                 
         except Exception as e:
-            print(f"删除数据异常: {e}")
+            logger.error("删除数据异常: %s", e)
             return False
 
     def get_device_data_range(self, device_id: str) -> Dict[str, str]:
@@ -395,7 +880,7 @@ class TDengineService:
         if not self.conn and not self.connect():
             return None
         
-        table_name = f"`device_{device_id}`"
+        table_name = _device_table(device_id)
         # TDengine uses FIRST(ts), LAST(ts)
         sql = f"SELECT FIRST(ts), LAST(ts) FROM {table_name}"
         
@@ -435,41 +920,29 @@ class TDengineService:
         }
 
         try:
-            # 1. Get Version
+            # 3.x: version, table / stable counts and creation time in one round-trip (one row per item)
+            db = self.database
+            rows = self.execute_query(
+                "SELECT 'version' AS k, CAST(SERVER_VERSION() AS VARCHAR(64)) AS v"
+                f" UNION ALL SELECT 'tables_count', CAST(COUNT(*) AS VARCHAR(32)) FROM information_schema.ins_tables WHERE db_name = '{db}'"
+                f" UNION ALL SELECT 'stables_count', CAST(COUNT(*) AS VARCHAR(32)) FROM information_schema.ins_stables WHERE db_name = '{db}'"
+                f" UNION ALL SELECT 'created_at', CAST(create_time AS VARCHAR(32)) FROM information_schema.ins_databases WHERE name = '{db}'"
+            )
+            if rows:
+                for row in rows:
+                    key, value = row.get('k'), row.get('v')
+                    if key in ("tables_count", "stables_count"):
+                        info[key] = int(value or 0)
+                    elif key in info and value:
+                        info[key] = value
+                return info
+
+            # 2.x (no information_schema): version and creation time only
             res_ver = self.execute_query("SELECT SERVER_VERSION()")
             if res_ver and len(res_ver) > 0:
                 # result key might be 'server_version()' or similar
                 info["version"] = list(res_ver[0].values())[0]
 
-            # 2. Get Tables Count
-            # Note: SHOW TABLES in 3.x might be different or require specific handling
-            # Using count if possible, or just length of list
-            # SHOW TABLES might return many rows, so be careful. 
-            # Ideally: SELECT COUNT(*) FROM information_schema.ins_tables WHERE db_name = ...
-            # But let's try SHOW TABLES first as it's more standard across versions for simple use
-            
-            # Using information_schema is better for 3.x
-            try:
-                # Try 3.x style
-                res_tables = self.execute_query(f"SELECT COUNT(*) FROM information_schema.ins_tables WHERE db_name = '{self.database}'")
-                if res_tables and len(res_tables) > 0:
-                     info["tables_count"] = list(res_tables[0].values())[0]
-                
-                res_stables = self.execute_query(f"SELECT COUNT(*) FROM information_schema.ins_stables WHERE db_name = '{self.database}'")
-                if res_stables and len(res_stables) > 0:
-                     info["stables_count"] = list(res_stables[0].values())[0]
-            except:
-                # Fallback to SHOW command (might be slow for many tables)
-                try:
-                    tables = self.execute_query("SHOW TABLES")
-                    info["tables_count"] = len(tables)
-                    
-                    stables = self.execute_query("SHOW STABLES")
-                    info["stables_count"] = len(stables)
-                except:
-                    pass
-
-            # 3. Get Database Info (Created Time)
             try:
                 # SHOW DATABASES returns list. Filter for current db.
                 dbs = self.execute_query("SHOW DATABASES")
@@ -487,19 +960,30 @@ class TDengineService:
             return info
 
         except Exception as e:
-            print(f"获取数据库信息失败: {e}")
+            logger.error("获取数据库信息失败: %s", e)
             return info
 
+    @staticmethod
+    def _param_schema(param) -> Tuple[Any, Any, bool]:
+        """参数（Parameter 或 dict）在超级表中的结构：(id, type, is_tag)"""
+        if isinstance(param, dict):
+            return param.get('id'), param.get('type'), bool(param.get('is_tag', False))
+        return param.id, param.type, bool(param.is_tag)
+
     def create_super_table(self, name: str, parameters: List[Dict[str, Any]]) -> bool:
         """创建超级表 (支持Schema Evolution)"""
+        schema = tuple(self._param_schema(param) for param in parameters)
+        if self._ensured_stables.get(name) == schema:
+            return True
+        
         # 1. Check if STABLE exists
-        exists_sql = f"SHOW STABLES LIKE '{name}'"
+        exists_sql = f"SHOW STABLES LIKE {_sql_string(name)}"
         existing = self.execute_query(exists_sql)
         
         if not existing:
             # Create new
-            columns_sql = "ts TIMESTAMP"
-            custom_tags_sql = ""
+            columns = ["ts TIMESTAMP"]
+            tags = ["device_name NCHAR(64)", "device_model NCHAR(64)"]
             
             for param in parameters:
                 p_type = param.type if hasattr(param, 'type') else param.get('type')
@@ -514,20 +998,18 @@ class TDengineService:
                 
                 col_type = self._get_tdengine_type(p_type)
                 
-                if is_tag:
-                    custom_tags_sql += f", `{p_id}` {col_type}"
-                else:
-                    columns_sql += f", `{p_id}` {col_type}"
+                (tags if is_tag else columns).append(f"`{p_id}` {col_type}")
             
-            tags_sql = "device_name NCHAR(64), device_model NCHAR(64)" + custom_tags_sql
-            sql = f"CREATE STABLE IF NOT EXISTS `{name}` ({columns_sql}) TAGS ({tags_sql})"
+            sql = f"CREATE STABLE IF NOT EXISTS `{name}` ({', '.join(columns)}) TAGS ({', '.join(tags)})"
             
             try:
-                print(f"创建超级表 SQL: {sql}")
+                logger.debug("创建超级表 SQL: %s", sql)
                 self.execute_update(sql)
+                self._ensured_stables[name] = schema
+                self._stable_tags.pop(name, None)
                 return True
             except Exception as e:
-                print(f"创建超级表失败: {e}")
+                logger.error("创建超级表失败: %s", e)
                 return False
         else:
             # STABLE exists, check columns and add missing ones
@@ -536,6 +1018,7 @@ class TDengineService:
                 cols_info = self.execute_query(desc_sql)
                 
                 existing_cols = set()
+                alters = []
                 for col in cols_info:
                     # Handle different case keys if necessary, usually capitalized
                     field = col.get('Field') or col.get('field')
@@ -559,90 +1042,193 @@ class TDengineService:
                         else:
                             alter_sql = f"ALTER STABLE `{name}` ADD COLUMN `{p_id}` {col_type}"
                             
-                        print(f"更新超级表结构: {alter_sql}")
-                        self.execute_update(alter_sql)
-                        
+                        logger.info("更新超级表结构: %s", alter_sql)
+                        alters.append(alter_sql)
+                
+                self.execute_batch(alters)
+                self._ensured_stables[name] = schema
+                if alters:
+                    self._stable_tags.pop(name, None)
                 return True
             except Exception as e:
-                print(f"检查/更新超级表失败: {e}")
+                logger.error("检查/更新超级表失败: %s", e)
                 return False
 
     def create_sub_table(self, super_table: str, sub_table: str, tags: Dict[str, Any]) -> bool:
         """创建子表"""
+        return self.create_sub_tables(super_table, [(sub_table, tags)])
+
+    def create_sub_tables(self, super_table: str, tables: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """
+        批量创建子表：CREATE TABLE IF NOT EXISTS t1 USING st TAGS (...) IF NOT EXISTS t2 USING st TAGS (...) ...，
+        每条语句最多 SUB_TABLES_PER_STATEMENT 张表；已知存在的表跳过
+        :param tables: [(sub_table, tags), ...]
+        """
+        tables = [(sub_table, tags) for sub_table, tags in tables if sub_table.strip("`") not in self._known_tables]
+        success = True
+        for i in range(0, len(tables), self.SUB_TABLES_PER_STATEMENT):
+            chunk = tables[i:i + self.SUB_TABLES_PER_STATEMENT]
+            sql = "CREATE TABLE " + " ".join([self._sub_table_clause(super_table, sub_table, tags) for sub_table, tags in chunk])
+            try:
+                logger.debug("创建子表 SQL: %s", sql)
+                self.execute_update(sql)
+                self._known_tables.update(sub_table.strip("`") for sub_table, _ in chunk)
+            except Exception as e:
+                logger.error("创建子表失败: %s", e)
+                success = False
+        return success
+
+    @staticmethod
+    def _sub_table_clause(super_table: str, sub_table: str, tags: Dict[str, Any]) -> str:
+        """单个子表的建表子句: IF NOT EXISTS t USING `st` TAGS (...)"""
         # TAGS values
         # We need to match the order of tags defined in create_super_table
         # Standard tags: device_name, device_model (device_id removed)
         
-        tag_vals = [
-            f"'{tags.get('device_name')}'", 
-            f"'{tags.get('device_model', '')}'"
-        ]
-        
         # Append custom tags (must be passed in 'tags' dict)
         # We iterate over keys that are NOT standard keys
         standard_keys = {'device_id', 'device_name', 'device_model'}
         
-        for k, v in tags.items():
-            if k not in standard_keys:
-                if v is None:
-                    tag_vals.append("NULL")
-                elif isinstance(v, str):
-                    tag_vals.append(f"'{v}'")
-                elif isinstance(v, bool):
-                    tag_vals.append("true" if v else "false")
-                else:
-                    tag_vals.append(str(v))
-        
-        tag_values_str = ", ".join(tag_vals)
+        tag_values_str = ", ".join([
+            _sql_string(str(tags.get('device_name'))),
+            _sql_string(str(tags.get('device_model', ''))),
+            *(_sql_value(v) for k, v in tags.items() if k not in standard_keys)
+        ])
         
-        sql = f"CREATE TABLE IF NOT EXISTS {sub_table} USING `{super_table}` TAGS ({tag_values_str})"
-        try:
-            print(f"创建子表 SQL: {sql}")
-            self.execute_update(sql)
-            return True
-        except Exception as e:
-            print(f"创建子表失败: {e}")
-            return False
+        # IF NOT EXISTS applies per table in a multi-table CREATE
+        return f"IF NOT EXISTS {sub_table} USING `{super_table}` TAGS ({tag_values_str})"
     
-    def insert_data(self, device_id: str, data: Dict[str, Any]) -> bool:
-        """插入单条数据"""
-        table_name = f"`device_{device_id}`"
+    def _build_insert_clause(self, device_id: str, data: Dict[str, Any]) -> str:
+        """构建单表插入子句: `device_x` (cols) VALUES (vals)"""
+        table_name = _device_table(device_id)
         
-        # 构建插入SQL
         ts = data.get("timestamp", "NOW")
+        values = data["data"]
         
-        columns = ["ts"]
-        values = [f"'{ts}'"]
-        
-        for param_name, value in data["data"].items():
-            columns.append(f"`{param_name}`")
-            if isinstance(value, str):
-                values.append(f"'{value}'")
-            elif isinstance(value, bool):
-                 # TDengine BOOL uses true/false or 1/0
-                 values.append("true" if value else "false")
-            else:
-                values.append(str(value))
+        columns_sql = ", ".join(["ts", *(f"`{param_name}`" for param_name in values)])
+        values_sql = ", ".join([f"'{ts}'", *map(_sql_value, values.values())])
         
-        columns_sql = ", ".join(columns)
-        values_sql = ", ".join(values)
-        
-        sql = f"INSERT INTO {table_name} ({columns_sql}) VALUES ({values_sql})"
+        return f"{table_name} ({columns_sql}) VALUES ({values_sql})"
+
+    def insert_data(self, device_id: str, data: Dict[str, Any]) -> bool:
+        """
+        插入单条数据（异步）：入队后立即返回，由后台线程每 WRITE_BATCH_TIMEOUT 秒
+        或设备积压达到 WRITE_BATCH_SIZE 条时合并写入；需要确认落库时调用 flush()
+        """
+        # Rows of one device with the same columns share a multi-VALUES INSERT
+        key = (device_id, tuple(data["data"]))
+        with self._write_lock:
+            # The writer sleeps while the queue is empty: wake it on the first row, and again once a backlog is full
+            first = not self._write_queue
+            queue = self._write_queue[key]
+            queue.append(data)
+            full = len(queue) >= self.WRITE_BATCH_SIZE
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._write_loop, name="TDengineWriter", daemon=True)
+                self._writer_thread.start()
+        if first or full:
+            self._write_wakeup.set()
+        return True
+
+    def flush(self):
+        """同步写出 insert_data 队列中的全部数据"""
+        with self._flush_lock:
+            with self._write_lock:
+                queue, self._write_queue = self._write_queue, defaultdict(list)
+            batches = [(device_id, rows[i:i + self.WRITE_BATCH_SIZE])
+                       for (device_id, _), rows in queue.items() for i in range(0, len(rows), self.WRITE_BATCH_SIZE)]
+            if self.use_rest:
+                # Multi-table INSERTs: one HTTP request per MAX_SQL_LENGTH of rows instead of one per device
+                self.batch_insert_multi(batches)
+            elif self._pool is not None:
+                self._stmt_insert_multi(batches)
+            else:
+                for device_id, rows in batches:
+                    self.batch_insert_data(device_id, rows)
+
+    def _stmt_insert_multi(self, batches: List[Tuple[str, List[Dict[str, Any]]]]):
+        """Native：按列集合分组，每组一次参数绑定写入多张表；失败的组回退为逐表写入"""
+        groups = defaultdict(list)
+        for device_id, rows in batches:
+            groups[tuple(rows[0]["data"])].append((device_id, rows))
+        for param_names, device_rows in groups.items():
+            try:
+                self._stmt_insert(list(param_names), [(_device_table(device_id), rows) for device_id, rows in device_rows])
+            except Exception as e:
+                # Rows re-written by the fallback overwrite themselves (same table and timestamp)
+                logger.warning("多表参数绑定写入失败，回退为逐表写入: %s", e)
+                for device_id, rows in device_rows:
+                    self.batch_insert_data(device_id, rows)
+
+    def _write_loop(self):
+        """后台批量写入线程"""
+        while True:
+            # Idle until a row is queued, then give the batch WRITE_BATCH_TIMEOUT to fill (a full backlog cuts it short)
+            self._write_wakeup.wait()
+            self._write_wakeup.clear()
+            self._write_wakeup.wait(self.WRITE_BATCH_TIMEOUT)
+            self._write_wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("批量写入线程异常: %s", e)
+
+    def _insert_row(self, device_id: str, data: Dict[str, Any]) -> bool:
+        """同步插入单条数据"""
+        sql = f"INSERT INTO {self._build_insert_clause(device_id, data)}"
         
         try:
             # print(f"插入数据 SQL: {sql}")
             self.execute_update(sql)
             return True
         except Exception as e:
-            print(f"插入数据失败: {e}")
+            logger.error("插入数据失败: %s", e)
             return False
+
+    def schemaless_insert(self, rows: List[Tuple[str, str, Dict[str, Any]]]):
+        """
+        Native无模式写入（InfluxDB 行协议）：绕过SQL解析，直接进入写入路径
+        :param rows: [(super_table, device_id, {"timestamp": ..., "data": {...}}), ...]
+        子表名由 tname 标签给出，需在客户端 taos.cfg 中配置 smlChildTableName tname
+        """
+        lines = [_line_protocol(super_table, f"device_{device_id}", data) for super_table, device_id, data in rows]
+        with self._acquire() as conn:
+            conn.schemaless_insert(lines, taos.SmlProtocol.LINE_PROTOCOL, taos.SmlPrecision.MILLI_SECONDS)
+
+    def multi_table_insert(self, rows: List[Tuple[str, Dict[str, Any]]], super_tables: Optional[Dict[str, str]] = None) -> bool:
+        """
+        多表批量插入：一条 INSERT INTO t1 (...) VALUES (...) t2 (...) VALUES (...) 语句，一次往返
+        :param rows: [(device_id, {"timestamp": ..., "data": {...}}), ...]
+        :param super_tables: device_id -> 超级表名；启用 tdengine_schemaless 时（Native）改用行协议写入
+        """
+        if not rows:
+            return True
+        
+        if settings.tdengine_schemaless and super_tables and not self.use_rest and self._pool is not None:
+            try:
+                self.schemaless_insert([(super_tables[device_id], device_id, data) for device_id, data in rows])
+                return True
+            except Exception as e:
+                logger.warning("无模式写入失败，回退为SQL写入: %s", e)
+        
+        try:
+            self._execute_inserts(self._pack_inserts(self._build_insert_clause(device_id, data) for device_id, data in rows))
+            return True
+        except Exception as e:
+            # 单个子表出错会导致整条语句失败，回退为逐表插入
+            logger.warning("多表批量插入失败，回退为逐表插入: %s", e)
+            results = [self._insert_row(device_id, data) for device_id, data in rows]
+            if not any(results):
+                # 全部失败视为连接问题，交给健康检查线程重连
+                self.mark_disconnected()
+            return all(results)
     
     def batch_insert_data(self, device_id: str, data_list: List[Dict[str, Any]]) -> bool:
         """批量插入数据"""
         if not data_list:
             return True
         
-        table_name = f"`device_{device_id}`"
+        table_name = _device_table(device_id)
         
         # Get columns from the first data item
         first_data = data_list[0]
@@ -653,46 +1239,110 @@ class TDengineService:
         
         columns_sql = ", ".join(columns)
         
-        # 构建批量插入SQL
-        sql = f"INSERT INTO {table_name} ({columns_sql}) VALUES "
+        if not self.use_rest and self._pool is not None:
+            # Native: prepared statement with bound columns; the SQL text path below is the fallback
+            try:
+                self._stmt_insert(param_names, [(table_name, data_list)])
+                return True
+            except Exception as e:
+                logger.warning("参数绑定写入失败，回退为SQL写入: %s", e)
         
-        values_parts = []
-        for data in data_list:
-            ts = data.get("timestamp", "NOW")
-            vals = [f"'{ts}'"]
-            
-            for param_name in param_names:
-                value = data["data"].get(param_name)
-                if isinstance(value, str):
-                    vals.append(f"'{value}'")
-                elif isinstance(value, bool):
-                     vals.append("true" if value else "false")
-                elif value is None:
-                    vals.append("NULL")
-                else:
-                    vals.append(str(value))
-            
-            values_parts.append(f"({', '.join(vals)})")
+        # 构建批量插入SQL
+        prefix = f"INSERT INTO {table_name} ({columns_sql}) VALUES "
+        values_parts = self._format_rows(param_names, data_list)
             
-        sql += ", ".join(values_parts)
-        
         try:
+            if self.use_rest and len(values_parts) > self.REST_BATCH_ROWS:
+                # Several smaller statements in flight at once instead of one large body
+                step = self.REST_BATCH_ROWS
+                return self._rest_execute_many([prefix + ", ".join(values_parts[i:i + step]) for i in range(0, len(values_parts), step)])
             # print(f"批量插入数据 SQL: {sql}")
-            self.execute_update(sql)
+            self.execute_update(prefix + ", ".join(values_parts))
             return True
         except Exception as e:
-            print(f"批量插入数据失败: {e}")
+            logger.error("批量插入数据失败: %s", e)
             return False
     
+    @staticmethod
+    def _format_rows(param_names: List[str], data_list: List[Dict[str, Any]]) -> List[str]:
+        """将一批数据行格式化为 VALUES 元组字符串，如 (ts, v1, v2, ...)"""
+        # Column-wise: pick each column's formatter once for the batch, format the column, then zip into rows.
+        # Payload dicts and bound methods are looked up once, not per cell
+        payloads = [data["data"] for data in data_list]
+        formatted = [[f"'{data.get('timestamp', 'NOW')}'" for data in data_list]]
+        append = formatted.append
+        for param_name in param_names:
+            column = [payload.get(param_name) for payload in payloads]
+            append(list(map(_column_formatter(column), column)))
+        join = ", ".join
+        return ["(" + join(row) + ")" for row in zip(*formatted)]
+
+    def _pack_inserts(self, clauses: Iterable[str]) -> List[str]:
+        """将多表插入子句打包为尽量少的 INSERT 语句（每条不超过 MAX_SQL_LENGTH 个字符）"""
+        statements, parts, size = [], [], 0
+        for clause in clauses:
+            if parts and size + len(clause) > self.MAX_SQL_LENGTH:
+                statements.append("INSERT INTO " + " ".join(parts))
+                parts, size = [], 0
+            parts.append(clause)
+            size += len(clause) + 1
+        if parts:
+            statements.append("INSERT INTO " + " ".join(parts))
+        return statements
+
+    def _execute_inserts(self, statements: List[str]):
+        """执行打包后的 INSERT 语句（REST 下多条语句并发发送）"""
+        if self.use_rest and len(statements) > 1:
+            self._rest_execute_many(statements)
+        else:
+            for sql in statements:
+                self.execute_update(sql)
+
+    def batch_insert_multi(self, device_rows: List[Tuple[str, List[Dict[str, Any]]]]) -> bool:
+        """
+        多表多行批量插入：INSERT INTO t1 (...) VALUES (...), (...) t2 (...) VALUES ...，按长度拆分为尽量少的语句
+        :param device_rows: [(device_id, [{"timestamp": ..., "data": {...}}, ...]), ...]，同一设备各行的列相同
+        """
+        device_rows = [(device_id, rows) for device_id, rows in device_rows if rows]
+        if not device_rows:
+            return True
+        
+        def clauses():
+            for device_id, rows in device_rows:
+                param_names = list(rows[0]["data"])
+                columns_sql = ", ".join(["ts", *(f"`{name}`" for name in param_names)])
+                yield f"{_device_table(device_id)} ({columns_sql}) VALUES " + ", ".join(self._format_rows(param_names, rows))
+        
+        try:
+            self._execute_inserts(self._pack_inserts(clauses()))
+            return True
+        except Exception as e:
+            # Rows re-written by the fallback overwrite themselves (same table and timestamp)
+            logger.warning("多表批量插入失败，回退为逐表插入: %s", e)
+            return all([self.batch_insert_data(device_id, rows) for device_id, rows in device_rows])
+
     def get_device_data(self, device_id: str, limit: int = 100, start_time: str = None, end_time: str = None) -> List[Dict[str, Any]]:
         """获取设备的数据，支持分页和时间范围"""
-        table_name = f"`device_{device_id}`"
+        return self.execute_query(self._device_data_sql(device_id, limit, start_time, end_time))
+
+    def iter_device_data(self, device_id: str, limit: int = 100, start_time: str = None, end_time: str = None) -> Iterator[Dict[str, Any]]:
+        """获取设备的数据（逐行产出，用于流式响应）"""
+        return self.iter_query(self._device_data_sql(device_id, limit, start_time, end_time))
+
+    def get_device_data_columnar(self, device_id: str, limit: int = 100, start_time: str = None, end_time: str = None) -> Dict[str, list]:
+        """获取设备的数据（按列返回，用于导出等大结果集）"""
+        return self.execute_query_columnar(self._device_data_sql(device_id, limit, start_time, end_time))
+
+    def _device_data_sql(self, device_id: str, limit: int, start_time: str = None, end_time: str = None) -> str:
+        if not start_time and not end_time:
+            return _latest_data_sql(device_id, limit)
+        table_name = _device_table(device_id)
         
         conditions = []
         if start_time:
-            conditions.append(f"ts >= '{start_time}'")
+            conditions.append(f"ts >= {_sql_string(str(start_time))}")
         if end_time:
-            conditions.append(f"ts <= '{end_time}'")
+            conditions.append(f"ts <= {_sql_string(str(end_time))}")
             
         where_clause = ""
         if conditions:
@@ -712,18 +1362,18 @@ class TDengineService:
         # For playback, we probably want ALL data in range, or at least a lot.
         # Let's handle limit.
         
-        sql = f"SELECT * FROM {table_name} {where_clause} ORDER BY ts DESC LIMIT {limit}"
-        return self.execute_query(sql)
+        return f"SELECT * FROM {table_name} {where_clause} ORDER BY ts DESC LIMIT {limit}"
     
     def delete_device_table(self, device_id: str) -> bool:
         """删除设备对应的表"""
-        table_name = f"`device_{device_id}`"
+        table_name = _device_table(device_id)
         sql = f"DROP TABLE IF EXISTS {table_name}"
+        self._known_tables.discard(f"device_{device_id}")
         try:
             self.execute_update(sql)
             return True
         except Exception as e:
-            print(f"删除表失败: {e}")
+            logger.error("删除表失败: %s", e)
             return False
 
 # 创建全局TDengine服务实例
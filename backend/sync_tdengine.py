@@ -1,15 +1,48 @@
 import sys
 import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from services.device_service import DeviceService
 from services.tdengine_service import tdengine_service
 from services.config_service import ConfigService
+from utils.logger import logger
 
 # Add current directory to sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Super tables whose sub-table DDL is in flight at once (shared REST keep-alive session / Native connection pool)
+SYNC_WORKERS = 16
+
+def _sub_table_tags(device):
+    """Sub table name and TAG values of one device"""
+    sub_table_name = f"`device_{device.id}`"
+    tags = {
+        "device_name": device.name,
+        "device_model": device.model or ""
+    }
+
+    # Extract custom tags from parameters
+    for param in device.parameters:
+        # Device.parameters are always Parameter models
+        if param.is_tag and param.id:
+            # Don't overwrite standard tags
+            if param.id in ["device_name", "device_model"]:
+                continue
+            tags[param.id] = param.default_value
+    return sub_table_name, tags
+
+def _sync_sub_tables(group):
+    """Create/Ensure the sub tables of one super table in bulk; returns (devices, tables, ok, error)"""
+    st_name, devices = group
+    tables = [_sub_table_tags(device) for device in devices]
+    try:
+        return devices, tables, tdengine_service.create_sub_tables(st_name, tables), None
+    except Exception as e:
+        return devices, tables, False, e
+
 def sync_tdengine():
     print("Starting TDengine synchronization...")
-    
+
     # Ensure TDengine is enabled
     if not ConfigService.is_tdengine_enabled():
         print("TDengine is disabled. Please enable it first.")
@@ -24,52 +57,34 @@ def sync_tdengine():
     devices = DeviceService.get_all_devices()
     print(f"Found {len(devices)} devices in database.")
 
+    # 1. Create/Ensure Super Tables: serially, since schema evolution of one super table must not race.
+    # Devices sharing a type and schema hit the service's schema cache (no round trip)
     for device in devices:
-        print(f"\nProcessing device: {device.name} (ID: {device.id}, Type: {device.type})")
-        
+        st_name = device.type
         try:
-            # 1. Create/Ensure Super Table
-            st_name = device.type
-            print(f"  Creating/Checking super table: {st_name}")
+            logger.info("Creating/Checking super table: %s (device %s)", st_name, device.name)
             if tdengine_service.create_super_table(st_name, device.parameters):
-                print(f"  Super table {st_name} synced.")
+                logger.info("  Super table %s synced.", st_name)
             else:
-                print(f"  Failed to sync super table {st_name}.")
-            
-            # 2. Create/Ensure Sub Table
-            sub_table_name = f"`device_{device.id}`"
-            tags = {
-                "device_name": device.name,
-                "device_model": device.model or ""
-            }
-            
-            # Extract custom tags from parameters
-            for param in device.parameters:
-                # Handle param object or dict
-                is_tag = False
-                if isinstance(param, dict):
-                    is_tag = param.get('is_tag', False)
-                    p_id = param.get('id')
-                    default_val = param.get('default_value')
-                else:
-                    is_tag = getattr(param, 'is_tag', False)
-                    p_id = getattr(param, 'id', None)
-                    default_val = getattr(param, 'default_value', None)
-                
-                if is_tag and p_id:
-                    # Don't overwrite standard tags
-                    if p_id in ["device_name", "device_model"]:
-                        continue
-                    tags[p_id] = default_val
-
-            print(f"  Creating/Checking sub table: {sub_table_name} with tags: {tags}")
-            if tdengine_service.create_sub_table(st_name, sub_table_name, tags):
-                 print(f"  Sub table {sub_table_name} synced.")
-            else:
-                 print(f"  Failed to sync sub table {sub_table_name}.")
-                 
+                logger.error("  Failed to sync super table %s.", st_name)
         except Exception as e:
-            print(f"  Error syncing device {device.name}: {e}")
+            logger.error("  Error syncing super table %s for device %s: %s", st_name, device.name, e)
+
+    # 2. Create/Ensure Sub Tables: bulk CREATE TABLE statements per super table, super tables concurrently
+    groups = defaultdict(list)
+    for device in devices:
+        groups[device.type].append(device)
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+        for group_devices, tables, ok, error in pool.map(_sync_sub_tables, groups.items()):
+            for device, (sub_table_name, tags) in zip(group_devices, tables):
+                logger.info("Processing device: %s (ID: %s, Type: %s)", device.name, device.id, device.type)
+                logger.info("  Creating/Checking sub table: %s with tags: %s", sub_table_name, tags)
+                if error is not None:
+                    logger.error("  Error syncing device %s: %s", device.name, error)
+                elif ok:
+                    logger.info("  Sub table %s synced.", sub_table_name)
+                else:
+                    logger.error("  Failed to sync sub table %s.", sub_table_name)
 
     print("\nSynchronization completed.")
 
@@ -0,0 +1,67 @@
+import zlib
+from starlette.responses import PlainTextResponse
+
+class GZipRequestMiddleware:
+    """
+    解压 Content-Encoding: gzip 的请求体后再交给路由（客户端批量提交的大 JSON 可压缩上传）。
+    未压缩的请求原样透传；解压后超过 max_size 字节返回 413（防 gzip 炸弹）。
+    """
+    def __init__(self, app, max_size: int = 50 * 1024 * 1024):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(
+                key == b"content-encoding" and value.strip().lower() == b"gzip" for key, value in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        # Decompress as the body arrives, never producing more than max_size + 1 bytes
+        decoder = zlib.decompressobj(wbits=31)
+        parts = []
+        size = 0
+        empty = True
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Client went away before the body was complete
+                return
+            data = message.get("body", b"")
+            empty = empty and not data
+            try:
+                while data:
+                    part = decoder.decompress(data, self.max_size - size + 1)
+                    size += len(part)
+                    if size > self.max_size:
+                        await PlainTextResponse("Request body too large", status_code=413)(scope, receive, send)
+                        return
+                    parts.append(part)
+                    data = decoder.unconsumed_tail
+                    if decoder.eof and decoder.unused_data:
+                        # Concatenated gzip members, as gzip.decompress accepts
+                        data = decoder.unused_data
+                        decoder = zlib.decompressobj(wbits=31)
+            except zlib.error:
+                await PlainTextResponse("Invalid gzip request body", status_code=400)(scope, receive, send)
+                return
+            if not message.get("more_body", False):
+                break
+        if not decoder.eof and not empty:
+            # Truncated stream
+            await PlainTextResponse("Invalid gzip request body", status_code=400)(scope, receive, send)
+            return
+        body = b"".join(parts)
+
+        # Downstream sees a plain request: drop the encoding, fix the length
+        headers = [(key, value) for key, value in scope["headers"] if key not in (b"content-encoding", b"content-length")]
+        headers.append((b"content-length", str(len(body)).encode()))
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(dict(scope, headers=headers), receive_body, send)
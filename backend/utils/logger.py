@@ -1,6 +1,8 @@
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 
 # Ensure logs directory exists
@@ -8,6 +10,9 @@ LOG_DIR = "logs"
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Listeners that own the console/file handlers (kept referenced so they aren't GC'd)
+_listeners = []
+
 def setup_logger(name: str = "app"):
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
@@ -24,7 +29,6 @@ def setup_logger(name: str = "app"):
     # Console Handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
 
     # File Handler (Rotating)
     file_handler = RotatingFileHandler(
@@ -34,9 +38,19 @@ def setup_logger(name: str = "app"):
         encoding="utf-8"
     )
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+
+    # The calling thread only enqueues the record; a background listener thread
+    # does the stdout / file I/O (including rotation)
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    # Drain queued records on interpreter exit
+    atexit.register(listener.stop)
 
     return logger
 
 # Global logger instance
+# Pass arguments lazily (logger.info("x=%s", x), not f-strings) so filtered records are never formatted
 logger = setup_logger("DeviceSimulator")
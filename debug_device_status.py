@@ -13,11 +13,10 @@ def check_running_devices():
         service = DeviceService()
         # The service uses its own session, but let's be explicit if needed.
         # implementation of get_all_devices usually opens a session.
-        devices = service.get_all_devices()
+        # Only running devices are loaded (filtered in SQL); the total is a COUNT(*)
+        running_devices = service.get_devices_by_status("running")
         
-        running_devices = [d for d in devices if d.status == "running"]
-        
-        print(f"Total devices: {len(devices)}")
+        print(f"Total devices: {service.count_devices()}")
         print(f"Running devices: {len(running_devices)}")
         
         for d in running_devices:
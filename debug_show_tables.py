@@ -1,11 +1,24 @@
 import sys
 import os
+from contextlib import closing
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
 # Add backend directory to path so imports work
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
 from services.tdengine_service import tdengine_service
 
+# Sample queries in flight at once (served by the service's REST session / Native connection pool)
+SAMPLE_WORKERS = 8
+
+def sample_stable(st_name):
+    """Latest rows of one super table; returns (rows, error)"""
+    try:
+        return tdengine_service.execute_query(f"SELECT * FROM `{st_name}` ORDER BY ts DESC LIMIT 3"), None
+    except Exception as e:
+        return None, e
+
 def check_show_tables():
     if tdengine_service.connect():
         print("\n--- STABLES (Super Tables) ---")
@@ -13,35 +26,35 @@ def check_show_tables():
         if stables:
             print(f"Total Super Tables: {len(stables)}")
             print(f"Columns: {stables[0].keys()}")
-            for row in stables:
-                # Use correct key for super table name
-                st_name = row.get('name') or row.get('stable_name') or row.get('table_name')
-                created_time = row.get('created_time')
-                print(f"STable: {st_name} | Created: {created_time}")
-                
-                # Query one super table to see tags
-                if st_name:
-                    print(f"\n   --- Sample Data from {st_name} ---")
-                    try:
-                        data = tdengine_service.execute_query(f"SELECT * FROM `{st_name}` ORDER BY ts DESC LIMIT 3")
-                        if data:
+            # Use correct key for super table name
+            st_names = [row.get('name') or row.get('stable_name') or row.get('table_name') for row in stables]
+            # Super tables have different schemas, so samples can't share one query: they are fetched concurrently
+            with ThreadPoolExecutor(max_workers=SAMPLE_WORKERS) as pool:
+                samples = pool.map(lambda name: sample_stable(name) if name else (None, None), st_names)
+                for row, st_name, (data, error) in zip(stables, st_names, samples):
+                    created_time = row.get('created_time')
+                    print(f"STable: {st_name} | Created: {created_time}")
+                    
+                    # Query one super table to see tags
+                    if st_name:
+                        print(f"\n   --- Sample Data from {st_name} ---")
+                        if error is not None:
+                            print(f"   Error querying {st_name}: {error}")
+                        elif data:
                             print(f"   Columns: {data[0].keys()}")
                             for d in data:
                                 print(f"   Row: {d}")
                         else:
                             print("   No data.")
-                    except Exception as e:
-                        print(f"   Error querying {st_name}: {e}")
 
         else:
             print("No Super Tables found.")
 
         print("\n--- TABLES (Sub Tables Sample) ---")
-        # Remove LIMIT from SQL as it might not be supported in SHOW TABLES
-        res = tdengine_service.execute_query("SHOW TABLES")
-        if res:
-            # Manually slice
-            for i, row in enumerate(res[:5]):
+        # Remove LIMIT from SQL as it might not be supported in SHOW TABLES.
+        # Rows are streamed and only the first 5 are read; closing the iterator releases the cursor / response
+        with closing(tdengine_service.iter_query("SHOW TABLES")) as res:
+            for i, row in enumerate(islice(res, 5)):
                 t_name = row.get('table_name')
                 print(f"Table: {t_name}")
                 # Describe one table
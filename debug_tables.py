@@ -2,19 +2,42 @@ import requests
 import json
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# orjson is optional: faster decoding of response bodies
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 BASE_URL = "http://localhost:8000"
 
+# Upper bound on per-stable table requests in flight at once
+MAX_WORKERS = 16
+
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_maxsize=MAX_WORKERS))
+
+def fetch_tables(s_name):
+    resp = session.get(f"{BASE_URL}/api/system/tdengine/tables", params={"stable": s_name})
+    return s_name, json_loads(resp.content)
+
 def check_devices_and_tables():
     print("Checking devices...")
     try:
-        # 1. Get Devices
-        resp = requests.get(f"{BASE_URL}/api/device/")
+        # 1. Get Devices and Stables (independent, so both requests are in flight together)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            devices_future = pool.submit(session.get, f"{BASE_URL}/api/device/")
+            stables_future = pool.submit(session.get, f"{BASE_URL}/api/system/tdengine/stables")
+            resp = devices_future.result()
+            stables_resp = stables_future.result()
         if resp.status_code != 200:
             print(f"Failed to get devices: {resp.status_code}")
             return
         
-        devices = resp.json()
+        devices = json_loads(resp.content)
         print(f"Found {len(devices)} devices.")
         
         if len(devices) == 0:
@@ -22,12 +45,12 @@ def check_devices_and_tables():
             return
 
         # 2. Get Stables
-        resp = requests.get(f"{BASE_URL}/api/system/tdengine/stables")
+        resp = stables_resp
         if resp.status_code != 200:
             print(f"Failed to get stables: {resp.status_code}")
             return
         
-        stables = resp.json()
+        stables = json_loads(resp.content)
         # Parse stable names
         stable_names = []
         for s in stables:
@@ -36,15 +59,17 @@ def check_devices_and_tables():
             
         print(f"Found {len(stable_names)} stables: {stable_names}")
         
-        # 3. Check Tables for each Stable
-        for s_name in stable_names:
-            print(f"Checking tables for stable '{s_name}'...")
-            resp = requests.get(f"{BASE_URL}/api/system/tdengine/tables?stable={s_name}")
-            tables = resp.json()
-            print(f"  - Found {len(tables)} tables: {tables}")
+        # 3. Check Tables for each Stable (concurrently; results printed in stable order)
+        if not stable_names:
+            return
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(stable_names))) as pool:
+            for s_name, tables in pool.map(fetch_tables, stable_names):
+                print(f"Checking tables for stable '{s_name}'...")
+                print(f"  - Found {len(tables)} tables: {tables}")
             
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    check_devices_and_tables()
+    with session:
+        check_devices_and_tables()
@@ -46,26 +46,16 @@ def test_get_tables():
 
     # 3. Describe Stable (to find tags)
     print("\n--- Describe Stable ---")
-    # Wrap in backticks
-    schema = tdengine_service.describe_table(f"`{target_stable}`")
-    print(f"Schema: {schema}")
-    
-    # Identify tags
-    # TDengine describe returns: Field, Type, Length, Note
-    # Note == 'TAG'
-    tags = [col['Field'] for col in schema if col.get('Note') == 'TAG']
+    # Tag columns are cached per stable by the service (one DESCRIBE per session)
+    tags = list(tdengine_service.describe_stable_tags(target_stable))
     print(f"Tags: {tags}")
 
     # 4. Get Tag Values for Child Table
     print("\n--- Get Tag Values ---")
     if tags:
-        # Use TBNAME in where clause
-        cols = ", ".join([f"`{t}`" for t in tags])
-        # Note: target_table needs to be quoted string for comparison, not backticks
-        sql = f"SELECT {cols} FROM `{target_stable}` WHERE tbname = '{target_table}' LIMIT 1"
-        print(f"SQL: {sql}")
+        # SELECT <tags> FROM <stable> WHERE tbname = '<table>' (the per-stable SQL prefix is cached by the service)
         try:
-            res = tdengine_service.execute_query(sql)
+            res = tdengine_service.get_tag_values(target_stable, target_table)
             print(f"Tag Values: {res}")
         except Exception as e:
             print(f"Error getting tags: {e}")
@@ -13,6 +13,9 @@ def migrate():
 
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    # Same journal settings as the backend (database_service): WAL, fsync only at checkpoints
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
     
     try:
         # Check if column exists
@@ -21,7 +24,7 @@ def migrate():
         
         if "timezone" not in columns:
             print("Adding 'timezone' column to system_settings...")
-            # Add column
+            # Add column (the DEFAULT also fills the existing rows)
             cursor.execute("ALTER TABLE system_settings ADD COLUMN timezone VARCHAR(50) DEFAULT 'UTC'")
             conn.commit()
             print("Migration successful.")
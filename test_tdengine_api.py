@@ -1,6 +1,13 @@
 import requests
 import json
 
+# orjson is optional: faster decoding of response bodies
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 BASE_URL = "http://localhost:8000"
 
 def test_tdengine_view():
@@ -14,7 +21,7 @@ def test_tdengine_view():
         print(f"Stables Status: {resp.status_code}")
         
         if resp.status_code == 200:
-            stables = resp.json()
+            stables = json_loads(resp.content)
             print(f"Stables Type: {type(stables)}")
             print(f"Stables Sample: {stables[:2] if stables else 'Empty'}")
             